@@ -0,0 +1,55 @@
+"""
+ホスト単位で1つだけ動かすバックグラウンドサービス（Keep-alive）
+
+gunicornではマスタープロセスのフック（gunicorn.conf.py）から起動し、
+ワーカーごとにスケジューラースレッドが増えないようにする。
+Flaskアプリを読み込まずに使えるよう、requestsやscheduleは起動時まで読み込まない。
+"""
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+scheduler_thread = None
+
+# Keep-alive機能
+def keep_alive():
+    """サーバーを常時稼働させるためのKeep-alive機能"""
+    import requests
+
+    try:
+        # 自分自身にリクエストを送信
+        base_url = os.environ.get('BASE_URL', 'http://localhost:5000')
+        response = requests.get(f"{base_url}/health", timeout=10)
+        if response.status_code == 200:
+            logger.info("Keep-alive ping successful")
+        else:
+            logger.warning(f"Keep-alive ping failed with status: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Keep-alive ping error: {e}")
+
+def run_scheduler():
+    """スケジューラーを実行する関数"""
+    import schedule
+
+    while True:
+        schedule.run_pending()
+        time.sleep(60)  # 1分ごとにチェック
+
+def start_background_services():
+    """Keep-aliveスケジューラーを起動する（同じプロセスで2回目以降の呼び出しは何もしない）"""
+    global scheduler_thread
+    if scheduler_thread is not None:
+        return
+
+    import schedule
+
+    # 15分ごとにKeep-aliveを実行
+    schedule.every(15).minutes.do(keep_alive)
+
+    # スケジューラーを別スレッドで実行
+    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+    scheduler_thread.start()
+    logger.info("Keep-alive scheduler started")
@@ -0,0 +1,79 @@
+"""
+起動時間のベンチマーク
+
+新しいPythonプロセスで main を読み込み、次の時間を計測する。
+- import: `import main` にかかった時間
+- first_response: import開始から /health の最初のレスポンスまでの時間
+- first_game_data: import開始から /game_data の最初のレスポンスまでの時間
+  （bs4/requestsの遅延読み込み分を含む。上流に繋がらない環境ではエラー応答までの時間）
+
+--eager を付けると、遅延読み込みしている重いモジュール（requests, bs4, lxml, schedule, dotenv）を
+先に読み込んでから計測し、遅延読み込みの効果と比較できる。
+
+使い方:
+    python bench_startup.py [--runs 5] [--eager]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 子プロセスで実行する計測コード
+CHILD_CODE = r'''
+import json, sys, time
+started = time.perf_counter()
+if {eager!r}:
+    import requests, bs4, lxml.etree, schedule, dotenv
+import main
+imported = time.perf_counter()
+client = main.app.test_client()
+client.get('/health')
+first_response = time.perf_counter()
+client.get('/game_data?page=%E3%82%A4%E3%83%8C&clicks=6&mytarget=%E3%83%8D%E3%82%B3')
+first_game_data = time.perf_counter()
+print(json.dumps({{
+    'import': imported - started,
+    'first_response': first_response - started,
+    'first_game_data': first_game_data - started,
+}}))
+'''
+
+
+def run_once(eager):
+    """新しいプロセスで1回計測する"""
+    env = dict(os.environ)
+    env.setdefault('FLASK_ENV', 'development')
+    # 計測中は上流に繋がらないようにして、ネットワークの待ち時間を含めない
+    env.setdefault('WIKI_API_URL', 'http://127.0.0.1:9/w/api.php')
+    env.setdefault('UPSTREAM_DEADLINE', '0.2')
+    env.setdefault('CACHE_SNAPSHOT_PATH', '')
+    env.setdefault('SCORE_DATA_DIR', '')
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD_CODE.format(eager=eager)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wiki SixHop startup benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--eager', action='store_true', help='重いモジュールを先に読み込んで比較する')
+    args = parser.parse_args()
+
+    results = [run_once(args.eager) for _ in range(args.runs)]
+    mode = 'eager' if args.eager else 'lazy'
+    print(f"mode={mode} runs={args.runs}")
+    for key in ('import', 'first_response', 'first_game_data'):
+        values = [result[key] * 1000 for result in results]
+        print(f"  {key:16s} median={statistics.median(values):7.1f}ms  min={min(values):7.1f}ms  max={max(values):7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
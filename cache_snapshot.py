@@ -0,0 +1,193 @@
+"""
+キャッシュスナップショットのファイル形式
+
+再起動やスリープ復帰後にキャッシュを温かい状態で戻すため、
+加工済み記事と発リンク先インデックスを1つのファイルに保存する。
+
+ファイル構成:
+    ヘッダー  : マジック(8バイト) + インデックス長(8バイト、リトルエンディアン)
+    インデックス: zlib圧縮したJSON {'created', 'aliases', 'entries': {タイトル: [オフセット, 長さ, 保存時刻, 版ID]}}
+    本体      : エントリーごとにzlib圧縮したJSON（オフセットは本体の先頭から）
+
+読み込み時はヘッダーとインデックスだけを読み、本体はmmap経由で必要になったエントリーだけ展開する。
+
+複数ワーカーで動かす場合、各ワーカーは自分のファイル（<パス>.<PID>）に書き出す。
+読み込み時は <パス> と <パス>.* をすべて開いてまとめ、同じタイトルは保存時刻の新しい方を使う。
+"""
+import glob
+import os
+import json
+import mmap
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b'SIXHOPS1'
+HEADER = struct.Struct('<8sQ')
+
+
+def encode_entry(payload):
+    """エントリー（dict）を圧縮済みバイト列に変換する"""
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_entry(data):
+    """圧縮済みバイト列をエントリー（dict）に戻す"""
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def write_snapshot(path, entries, aliases):
+    """
+    スナップショットをアトミックに書き出す
+    - entries: (タイトル, 保存時刻, 版ID, 圧縮済みバイト列) のイテラブル
+    - 同じディレクトリの一時ファイルに書いてからos.replaceで置き換える
+    戻り値は書き出したエントリー数
+    """
+    index = {}
+    chunks = []
+    offset = 0
+    for title, timestamp, revid, data in entries:
+        index[title] = [offset, len(data), timestamp, revid]
+        chunks.append(data)
+        offset += len(data)
+
+    index_data = zlib.compress(json.dumps({
+        'created': time.time(),
+        'aliases': aliases,
+        'entries': index,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(index_data)))
+        f.write(index_data)
+        for data in chunks:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(index)
+
+
+class SnapshotReader:
+    """
+    スナップショットの読み込み
+    エントリーは取り出したら（pop）インデックスから消し、同じ古いデータを何度も返さない
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            # 読み込んだ後に書き直されていないかの確認用
+            self.mtime = os.fstat(self.file.fileno()).st_mtime_ns
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, index_length = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Invalid snapshot file: {path}")
+            index_end = HEADER.size + index_length
+            index = json.loads(zlib.decompress(self.data[HEADER.size:index_end]).decode('utf-8'))
+        except Exception:
+            self.file.close()
+            raise
+        self.body_offset = index_end
+        self.created = index.get('created', 0)
+        self.aliases = index.get('aliases', {})
+        self.entries = index.get('entries', {})
+
+    def __len__(self):
+        return len(self.entries)
+
+    def read_raw(self, meta):
+        """インデックスのメタ情報から圧縮済みバイト列を取り出す"""
+        offset, length = meta[0], meta[1]
+        start = self.body_offset + offset
+        return self.data[start:start + length]
+
+    def pop(self, title):
+        """エントリーを取り出す（なければNone）。戻り値は (内容, 保存時刻, 版ID)"""
+        with self.lock:
+            meta = self.entries.pop(title, None)
+        if meta is None:
+            return None
+        return decode_entry(self.read_raw(meta)), meta[2], meta[3]
+
+    def remaining(self):
+        """まだ取り出されていないエントリーを (タイトル, 保存時刻, 版ID, 圧縮済みバイト列) で返す"""
+        with self.lock:
+            items = list(self.entries.items())
+        return [(title, meta[2], meta[3], self.read_raw(meta)) for title, meta in items]
+
+
+def worker_snapshot_path(path, pid=None):
+    """ワーカーごとのスナップショットのパス（<パス>.<PID>）"""
+    return f'{path}.{pid or os.getpid()}'
+
+
+def find_snapshots(path):
+    """読み込み対象のスナップショット（<パス> と、各ワーカーが書き出した <パス>.*）"""
+    paths = [path] if os.path.exists(path) else []
+    paths.extend(sorted(p for p in glob.glob(f'{glob.escape(path)}.*') if not p.endswith('.tmp')))
+    return paths
+
+
+class MergedSnapshotReader:
+    """
+    複数のスナップショットをまとめて読む（SnapshotReaderと同じ使い方ができる）
+    同じタイトルは保存時刻の新しいエントリーを使い、別名マップは新しいファイルの内容を優先する
+    """
+
+    def __init__(self, readers):
+        self.lock = threading.Lock()
+        self.readers = readers
+        self.created = max(reader.created for reader in readers)
+        self.aliases = {}
+        self.entries = {}
+        for number, reader in sorted(enumerate(readers), key=lambda item: item[1].created):
+            self.aliases.update(reader.aliases)
+            for title, meta in reader.entries.items():
+                current = self.entries.get(title)
+                if current is None or meta[2] > current[2]:
+                    # 末尾にどのファイルのエントリーかを持たせる
+                    self.entries[title] = meta[:4] + [number]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def read_raw(self, meta):
+        """インデックスのメタ情報から圧縮済みバイト列を取り出す"""
+        return self.readers[meta[4]].read_raw(meta)
+
+    def pop(self, title):
+        """エントリーを取り出す（なければNone）。戻り値は (内容, 保存時刻, 版ID)"""
+        with self.lock:
+            meta = self.entries.pop(title, None)
+        if meta is None:
+            return None
+        return decode_entry(self.read_raw(meta)), meta[2], meta[3]
+
+    def remaining(self):
+        """まだ取り出されていないエントリーを (タイトル, 保存時刻, 版ID, 圧縮済みバイト列) で返す"""
+        with self.lock:
+            items = list(self.entries.items())
+        return [(title, meta[2], meta[3], self.read_raw(meta)) for title, meta in items]
+
+    def remove_superseded(self, keep):
+        """
+        読み込んだファイルのうち、読み込み後に書き直されていないものを削除する
+        （その内容は自分のスナップショットに引き継ぎ済みのため）。keepは残すパス
+        """
+        removed = 0
+        for reader in self.readers:
+            if reader.path == keep:
+                continue
+            try:
+                if os.stat(reader.path).st_mtime_ns == reader.mtime:
+                    os.remove(reader.path)
+                    removed += 1
+            except OSError:
+                # 他のワーカーが先に削除した、または書き直した
+                pass
+        return removed
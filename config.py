@@ -1,8 +1,9 @@
 import os
-from dotenv import load_dotenv
 
-# 環境変数を読み込み
-load_dotenv()
+# 環境変数を読み込み（.envがある場合のみpython-dotenvを読み込み、起動時間を短縮）
+if os.path.exists('.env') or os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 class Config:
     """アプリケーション設定クラス"""
@@ -27,6 +28,67 @@ class Config:
     SECURE_HEADERS = os.environ.get('SECURE_HEADERS', 'True').lower() == 'true'
     HSTS_MAX_AGE = int(os.environ.get('HSTS_MAX_AGE', '31536000'))
     
+    # 上流（Wikipedia API）耐障害性設定
+    UPSTREAM_DEADLINE = float(os.environ.get('UPSTREAM_DEADLINE', '3.0'))  # リトライを含む全体の期限（秒）
+    UPSTREAM_MAX_ATTEMPTS = int(os.environ.get('UPSTREAM_MAX_ATTEMPTS', '2'))
+    BREAKER_WINDOW = float(os.environ.get('BREAKER_WINDOW', '60'))  # 統計を取る期間（秒）
+    BREAKER_MIN_REQUESTS = int(os.environ.get('BREAKER_MIN_REQUESTS', '10'))
+    BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', '0.5'))
+    BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', '1.5'))
+    BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', '30'))
+    NEGATIVE_CACHE_TTL = int(os.environ.get('NEGATIVE_CACHE_TTL', '60'))
+    STALE_CACHE_MAX_AGE = int(os.environ.get('STALE_CACHE_MAX_AGE', '3600'))
+    
+    # サーバーサイドキャッシュの上限と掃除（上限を超えたら古く保存したものから捨てる）
+    PAGE_CACHE_MAX = int(os.environ.get('PAGE_CACHE_MAX', '500'))  # APIのレスポンス（障害時の期限切れ配信用）
+    SECTION_CACHE_MAX = int(os.environ.get('SECTION_CACHE_MAX', '1000'))  # セクション分割済みの記事
+    NEGATIVE_CACHE_MAX = int(os.environ.get('NEGATIVE_CACHE_MAX', '5000'))
+    CACHE_SWEEP_INTERVAL = int(os.environ.get('CACHE_SWEEP_INTERVAL', '60'))  # 期限切れのエントリーを掃除する間隔（秒、0で無効）
+    
+    # 上流へのリクエストの流量制御（キャッシュヒットは対象外）
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '8'))  # 上流への同時リクエスト数
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '16'))  # 空きを待てるリクエスト数（超えたら即座に断る）
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '1.0'))  # 空きを待つ最大秒数
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', '5'))  # 503応答のRetry-After（秒）
+    
+    # HTML加工用プロセスプール設定（0で無効、autoでCPUコア数）
+    HTML_PROCESS_POOL_SIZE = (os.cpu_count() or 1) if os.environ.get('HTML_PROCESS_POOL_SIZE', '0') == 'auto' \
+        else int(os.environ.get('HTML_PROCESS_POOL_SIZE', '0'))
+    HTML_POOL_QUEUE_SIZE = int(os.environ.get('HTML_POOL_QUEUE_SIZE', '8'))  # 実行中以外に待機できるタスク数
+    HTML_POOL_TIMEOUT = float(os.environ.get('HTML_POOL_TIMEOUT', '2.0'))  # キューでの待機＋処理の期限（秒、過ぎても処理中なら結果を待つ）
+    HTML_POOL_LATE_TIMEOUT = float(os.environ.get('HTML_POOL_LATE_TIMEOUT', '3.0'))  # 期限後に処理中のタスクを待つ最大秒数
+    
+    # ページ単位のリンク一覧（/page_links）の共有キャッシュ設定
+    PAGE_LINKS_STALE_SECONDS = int(os.environ.get('PAGE_LINKS_STALE_SECONDS', '600'))  # 期限切れ後も再検証しながら返してよい秒数
+    PAGE_LINKS_BATCH_MAX = int(os.environ.get('PAGE_LINKS_BATCH_MAX', '20'))  # 一括取得1回あたりの最大ページ数
+    PAGE_LINKS_BATCH_CONCURRENCY = int(os.environ.get('PAGE_LINKS_BATCH_CONCURRENCY', '4'))  # 一括取得1回あたりの上流への同時取得数
+    
+    # 静的ファイルのフィンガープリント設定（ビルド先の既定はアプリのディレクトリのstatic_build）
+    ENABLE_ASSET_FINGERPRINTING = os.environ.get('ENABLE_ASSET_FINGERPRINTING', 'True').lower() == 'true'
+    STATIC_BUILD_DIR = os.environ.get('STATIC_BUILD_DIR', '')
+    
+    # クリア結果の集計設定（SCORE_DATA_DIRを空にすると無効。同じホストの複数ワーカーで共有できる）
+    SCORE_DATA_DIR = os.environ.get('SCORE_DATA_DIR', 'score_data')
+    SCORE_FLUSH_INTERVAL = float(os.environ.get('SCORE_FLUSH_INTERVAL', '2.0'))  # バッファをログに書き出す間隔（秒）
+    SCORE_COMPACT_INTERVAL = int(os.environ.get('SCORE_COMPACT_INTERVAL', '600'))  # スナップショットを作る間隔（秒）
+    SCORE_BUFFER_MAX = int(os.environ.get('SCORE_BUFFER_MAX', '10000'))
+    SCORE_MAX_TARGETS = int(os.environ.get('SCORE_MAX_TARGETS', '5000'))  # 集計を保持する目標ページ数
+    SCORE_TOP_PATHS = int(os.environ.get('SCORE_TOP_PATHS', '50'))  # 目標ページごとに数える経路の数（Space-Saving）
+    SCORE_LEADERBOARD_SIZE = int(os.environ.get('SCORE_LEADERBOARD_SIZE', '10'))
+    
+    # 管理用エンドポイント（/admin/...）のトークン（空なら管理用エンドポイントは無効）
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    MEMORY_REPORT_SAMPLE = int(os.environ.get('MEMORY_REPORT_SAMPLE', '2000'))  # これを超える層は先頭から測定して推定
+    
+    # キャッシュスナップショット設定（空文字で無効）
+    CACHE_SNAPSHOT_PATH = os.environ.get('CACHE_SNAPSHOT_PATH', 'cache_snapshot.bin')
+    CACHE_SNAPSHOT_INTERVAL = int(os.environ.get('CACHE_SNAPSHOT_INTERVAL', '300'))  # 書き出し間隔（秒、0で終了時のみ）
+    CACHE_SNAPSHOT_MAX_AGE = int(os.environ.get('CACHE_SNAPSHOT_MAX_AGE', '604800'))  # これより古いエントリーは保存しない
+    
+    # タイトル別名マップ（リダイレクト・正規化情報）の最大件数
+    TITLE_ALIAS_MAX = int(os.environ.get('TITLE_ALIAS_MAX', '20000'))
+    TITLE_INTERN_MAX = int(os.environ.get('TITLE_INTERN_MAX', '200000'))  # 超えたら生きているインデックスだけで作り直す
+    
     # ゲーム設定
     TARGET_TITLE = "ネコ"
     INITIAL_CLICKS = 6
@@ -36,6 +98,13 @@ class Config:
     ENABLE_HTML_COMPRESSION = os.environ.get('ENABLE_HTML_COMPRESSION', 'True').lower() == 'true'
     REMOVE_EXTERNAL_LINKS = os.environ.get('REMOVE_EXTERNAL_LINKS', 'True').lower() == 'true'
     
+    # ストリーミング配信設定（ページの骨組みを先に送信）
+    ENABLE_STREAMING_RENDER = os.environ.get('ENABLE_STREAMING_RENDER', 'True').lower() == 'true'
+    
+    # 長い記事のセクション単位遅延配信設定
+    ENABLE_CHUNKED_ARTICLES = os.environ.get('ENABLE_CHUNKED_ARTICLES', 'True').lower() == 'true'
+    CHUNK_MIN_BYTES = int(os.environ.get('CHUNK_MIN_BYTES', '20000'))  # これより小さい記事は一括で返す
+    
     # 除外するリンクのプレフィックスリスト
     EXCLUDED_PREFIXES = [
         '/wiki/Special:',
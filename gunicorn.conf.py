@@ -0,0 +1,32 @@
+# gunicorn設定
+# バックグラウンドサービス（Keep-alive）はワーカーごとではなく、マスタープロセスで1回だけ起動する
+import os
+
+# ワーカー側（main.py）でバックグラウンドサービスを起動しないようにする
+os.environ['BACKGROUND_SERVICES'] = 'hooks'
+
+def when_ready(server):
+    """マスタープロセスの起動完了時に呼ばれる"""
+    if os.environ.get('FLASK_ENV', 'development') == 'production':
+        from background import start_background_services
+        start_background_services()
+        server.log.info("Background services started in master process")
+
+def post_fork(server, worker):
+    """
+    ワーカーのfork直後に呼ばれる（まだ他のスレッドが動いていない）
+    --preloadでmain.pyを読み込み済みの場合、親から引き継いだHTML加工用プールとクリア結果の集計は使えないのでここで作り直す
+    """
+    import sys
+
+    main = sys.modules.get('main')
+    if main is None:
+        return
+    if main.HTML_PROCESS_POOL_SIZE > 0 and main.html_pool is None:
+        main.start_html_pool()
+    if main.score_store is not None and main.score_store.thread is None:
+        try:
+            main.score_store.start()
+        except Exception as e:
+            worker.log.error(f"Failed to start score store: {e}")
+            main.score_store = None
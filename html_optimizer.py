@@ -0,0 +1,142 @@
+"""
+記事HTMLの加工処理（最適化・セクション分割）
+
+BeautifulSoupによる純粋なCPU処理だけをまとめたモジュール。
+Flaskアプリに依存しないため、プロセスプールのワーカーからも軽量にインポートできる。
+"""
+import re
+from bs4 import BeautifulSoup
+
+
+def optimize_html(parsed_html, remove_external_links=True, enable_compression=True):
+    """
+    HTMLコンテンツを最適化して軽量化する
+    - 不要なタグ、要素、属性を削除
+    - HTMLを圧縮して転送サイズを削減
+    """
+    soup = BeautifulSoup(parsed_html, 'lxml')
+    
+    # タグ名で削除する要素（高速）
+    tags_to_remove = ['style', 'script', 'noscript', 'iframe', 'embed', 'object']
+    for tag_name in tags_to_remove:
+        for tag in soup.find_all(tag_name):
+            tag.decompose()
+    
+    # CSSセレクタで削除する要素
+    selectors_to_remove = [
+        '.mw-editsection',    # 編集セクション
+        '.mw-jump-link',      # ジャンプリンク
+        '.reference',         # 参考文献
+        '.mw-cite-backlink',  # 引用リンク
+        '.noprint',           # 印刷しない要素
+        '.ambox',             # メッセージボックス
+        '.navbox',            # ナビゲーションボックス
+        '.sistersitebox',     # 姉妹サイトボックス
+        '.metadata',          # メタデータ
+        '.catlinks',          # カテゴリリンク
+        '.reflist',           # 参考文献リスト
+        '.thumb',             # サムネイル画像
+        '.gallery',           # ギャラリー
+        '.toc',               # 目次
+        '.infobox',           # インフォボックス（表が大きいため）
+        '.sidebar',           # サイドバー
+        '.navbox-inner',      # ナビボックスの内部
+        '.refbegin',          # 参考文献の開始
+        '.portalbox',         # ポータルボックス
+        '.hatnote',           # ヘッドノート
+        '.dablink',           # 曖昧さ回避リンク
+        '.rellink',           # 関連リンク
+        '.mainarticle',       # メイン記事
+        '#toc',               # 目次のID
+        'table',              # すべてのテーブル（大きいため）
+        'sup.reference',      # 上付き参照
+        'ol.references',      # 参考文献のリスト
+    ]
+    
+    for selector in selectors_to_remove:
+        for element in soup.select(selector):
+            element.decompose()
+    
+    # 外部リンクを完全に削除（設定で制御）
+    if remove_external_links:
+        for a in soup.find_all('a', href=True):
+            href = a.get('href', '')
+            # Wikipedia内のリンク以外を削除
+            if not href.startswith('/wiki/'):
+                a.decompose()
+    
+    # 画像の遅延読み込み属性を追加（オプション）
+    for img in soup.find_all('img'):
+        img['loading'] = 'lazy'
+        # srcset属性を削除（複数解像度の画像を削除）
+        if 'srcset' in img.attrs:
+            del img['srcset']
+    
+    # 不要な属性を削除（リンク以外）
+    for element in soup.find_all():
+        # リンク要素のhref属性は保持
+        if element.name == 'a':
+            attrs_to_keep = ['href', 'title']
+        # 画像要素のsrc属性は保持
+        elif element.name == 'img':
+            attrs_to_keep = ['src', 'alt', 'loading']
+        else:
+            attrs_to_keep = []
+        
+        # 不要な属性を削除
+        attrs = list(element.attrs.keys())
+        for attr in attrs:
+            if attr not in attrs_to_keep:
+                del element.attrs[attr]
+    
+    # HTMLを文字列に変換
+    html_str = str(soup)
+    
+    # HTMLの圧縮（minification）
+    if enable_compression:
+        # 連続する空白を単一の空白に置換
+        html_str = re.sub(r'\s+', ' ', html_str)
+        # タグ間の空白を削除
+        html_str = re.sub(r'>\s+<', '><', html_str)
+        # タグ後の空白を削除
+        html_str = re.sub(r'>\s+', '>', html_str)
+        # タグ前の空白を削除
+        html_str = re.sub(r'\s+<', '<', html_str)
+    
+    return html_str
+
+
+def split_sections(parsed_html):
+    """
+    最適化済みHTMLを見出し（h2）単位のセクションに分割する
+    戻り値は (見出しテキスト, HTML) のタプル。先頭はリード部（見出しは空文字）
+    """
+    soup = BeautifulSoup(parsed_html, 'lxml')
+    root = soup.body or soup
+    # mw-parser-outputなど、全体を包むだけの要素は（中にh2があっても）降りていく
+    while True:
+        children = [child for child in root.contents if not (isinstance(child, str) and not child.strip())]
+        if len(children) == 1 and getattr(children[0], 'name', None) == 'div':
+            root = children[0]
+        else:
+            break
+
+    sections = []
+    heading, nodes = '', []
+    for node in root.contents:
+        name = getattr(node, 'name', None)
+        # 見出しはh2単体、または最初の子要素がh2のdiv（mw-heading）のどちらか
+        h2 = node if name == 'h2' else (node.find(True, recursive=False) if name == 'div' else None)
+        if h2 is not None and h2.name == 'h2':
+            sections.append((heading, ''.join(str(n) for n in nodes)))
+            heading, nodes = h2.get_text(strip=True), []
+        nodes.append(node)
+    sections.append((heading, ''.join(str(n) for n in nodes)))
+    return tuple(sections)
+
+
+def process_article(parsed_html, enable_optimization=True, remove_external_links=True, enable_compression=True):
+    """生の記事HTMLを最適化してセクションに分割する（プロセスプールで実行する単位）"""
+    if enable_optimization:
+        parsed_html = optimize_html(parsed_html, remove_external_links, enable_compression)
+    return split_sections(parsed_html)
@@ -1,8 +1,7 @@
 import os
-import requests
-from flask import Flask, render_template, redirect, url_for, request, jsonify, make_response
-from urllib.parse import unquote
-from bs4 import BeautifulSoup, SoupStrainer
+from flask import Flask, render_template, redirect, url_for, request, jsonify, make_response, Response, stream_with_context, send_from_directory, abort
+from markupsafe import Markup
+from urllib.parse import unquote, urlparse
 from flask.views import MethodView
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -12,10 +11,14 @@ import time
 import re
 import html
 import threading
-import schedule
+import queue
+import atexit
+import sys
+from array import array
+from bisect import bisect_left
 from functools import lru_cache
+from collections import deque, OrderedDict
 from config import config
-import hashlib
 
 # 設定の読み込み
 config_name = os.environ.get('FLASK_ENV', 'development')
@@ -55,14 +58,39 @@ def after_request(response):
         if request.is_secure:
             response.headers['Strict-Transport-Security'] = f'max-age={app.config["HSTS_MAX_AGE"]}; includeSubDomains'
     
+    # 管理用エンドポイントはキャッシュさせない
+    if request.endpoint in ('metrics', 'admin_memory', 'admin_tracemalloc'):
+        response.cache_control.no_store = True
     # 静的ファイルのキャッシュ設定
-    if request.endpoint == 'static':
+    elif request.endpoint == 'static':
         response.cache_control.max_age = 3600  # 1時間
         response.cache_control.public = True
+    # フィンガープリント付きの静的ファイルは内容が変わらないので1年間・immutable（古いURLのリダイレクトはキャッシュしない）
+    elif request.endpoint == 'assets':
+        if response.status_code in (200, 206, 304):
+            # send_from_directoryが付けるno-cacheは外す
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = ASSET_MAX_AGE
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
     # APIエンドポイントのキャッシュ設定
     elif request.endpoint == 'game_data':
         response.cache_control.max_age = 300  # 5分
         response.cache_control.private = True
+    # クリア統計は数秒ごとにしか変わらないので短時間の共有キャッシュを許可
+    elif request.endpoint == 'stats':
+        response.cache_control.max_age = 30
+        response.cache_control.public = True
+    # ページ単位のリンク一覧はプレイヤーに依存しないため、共有キャッシュ（Service Worker・リバースプロキシ）に任せる
+    elif request.endpoint == 'page_links':
+        if response.status_code in (200, 301, 302, 304) and (response.get_etag()[0] or response.location):
+            response.cache_control.max_age = CACHE_EXPIRY
+            response.cache_control.public = True
+            response.headers['Cache-Control'] += f', stale-while-revalidate={PAGE_LINKS_STALE_SECONDS}'
+        else:
+            response.cache_control.no_store = True
     
     return response
 
@@ -71,32 +99,124 @@ TARGET_TITLE = app.config['TARGET_TITLE']
 INITIAL_CLICKS = app.config['INITIAL_CLICKS']
 WIKI_API_URL = app.config['WIKI_API_URL']
 
-# セッション設定（接続プールとタイムアウト最適化）
-session = requests.Session()
-session.headers.update({
-    'User-Agent': app.config['USER_AGENT'],
-    'Accept': 'application/json',
-    'Accept-Encoding': 'gzip, deflate',
-    'Connection': 'keep-alive'
-})
-
-# 接続プールの設定
-adapter = requests.adapters.HTTPAdapter(
-    pool_connections=10,
-    pool_maxsize=20,
-    max_retries=3,
-    pool_block=False
-)
-session.mount('http://', adapter)
-session.mount('https://', adapter)
+# HTTPセッション（起動時間短縮のため、requestsの読み込みとセッション作成は初回使用時に行う）
+session = None
+session_lock = threading.Lock()
+
+def get_session():
+    """接続プールとタイムアウトを最適化したHTTPセッションを返す（初回呼び出し時に作成）"""
+    global session
+    if session is None:
+        with session_lock:
+            if session is None:
+                import requests
+
+                # セッション設定（接続プールとタイムアウト最適化）
+                new_session = requests.Session()
+                new_session.headers.update({
+                    'User-Agent': app.config['USER_AGENT'],
+                    'Accept': 'application/json',
+                    'Accept-Encoding': 'gzip, deflate',
+                    'Connection': 'keep-alive'
+                })
+
+                # 接続プールの設定
+                # リトライはwiki_get()が全体の期限内で行うため、アダプター側では行わない
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=10,
+                    pool_maxsize=20,
+                    max_retries=0,
+                    pool_block=False
+                )
+                new_session.mount('http://', adapter)
+                new_session.mount('https://', adapter)
+                session = new_session
+    return session
 
 # 除外するリンクのプレフィックスリスト
 EXCLUDED_PREFIXES = app.config['EXCLUDED_PREFIXES']
 
-# サーバーサイドキャッシュ
-page_cache = {}
-links_cache = {}  # 解析済みリンク情報のキャッシュ
+# サーバーサイドキャッシュ（保存した順に並べ、上限を超えたら古いものから捨てる）
+page_cache = OrderedDict()
+links_cache = {}  # ページごとの発リンク先インデックス（OutlinkIndex）のキャッシュ
+section_cache = OrderedDict()  # 最適化済みHTMLをセクション単位に分割したもののキャッシュ
 CACHE_EXPIRY = 300  # 5分間キャッシュ
+negative_cache = OrderedDict()  # 存在しないページ・取得に失敗したページのキャッシュ
+PAGE_CACHE_MAX = app.config['PAGE_CACHE_MAX']
+SECTION_CACHE_MAX = app.config['SECTION_CACHE_MAX']
+NEGATIVE_CACHE_MAX = app.config['NEGATIVE_CACHE_MAX']
+CACHE_SWEEP_INTERVAL = app.config['CACHE_SWEEP_INTERVAL']
+cache_evict_lock = threading.Lock()
+cache_sweep_stats = {'sweeps': 0, 'swept': 0, 'evicted': 0}
+
+# ページ単位のリンク一覧の設定（ペイロードの形式を変えたらPAGE_LINKS_VERSIONを上げる）
+PAGE_LINKS_VERSION = 1
+PAGE_LINKS_STALE_SECONDS = app.config['PAGE_LINKS_STALE_SECONDS']
+PAGE_LINKS_BATCH_MAX = app.config['PAGE_LINKS_BATCH_MAX']
+PAGE_LINKS_BATCH_CONCURRENCY = app.config['PAGE_LINKS_BATCH_CONCURRENCY']
+
+page_revisions = {}  # 正規タイトル -> 版ID（スナップショットの再検証と/page_linksのETagに使う）
+
+# キャッシュスナップショットの設定（再起動・スリープ復帰後にキャッシュを温かい状態で戻す）
+CACHE_SNAPSHOT_PATH = app.config['CACHE_SNAPSHOT_PATH']
+CACHE_SNAPSHOT_INTERVAL = app.config['CACHE_SNAPSHOT_INTERVAL']
+CACHE_SNAPSHOT_MAX_AGE = app.config['CACHE_SNAPSHOT_MAX_AGE']
+cache_generation = 0  # 加工済みキャッシュの更新回数（スナップショットの変更検知用）
+snapshot_generation = 0  # 最後にスナップショットを書き出した時点のcache_generation
+snapshot_reader = None
+snapshot_last_written = None
+snapshot_loaded = False
+snapshot_lock = threading.Lock()
+revalidation_queue = queue.Queue(maxsize=1000)
+revalidation_pending = set()
+revalidation_lock = threading.Lock()
+revalidation_thread = None
+
+# タイトルの別名マップ（正規化・リダイレクト元タイトル -> 正規タイトル）
+title_aliases = OrderedDict()
+title_alias_lock = threading.Lock()
+TITLE_ALIAS_MAX = app.config['TITLE_ALIAS_MAX']
+circuit_breakers = {}  # ホストごとのサーキットブレーカー
+
+# 上流（Wikipedia API）耐障害性の設定
+UPSTREAM_DEADLINE = app.config['UPSTREAM_DEADLINE']
+UPSTREAM_MAX_ATTEMPTS = app.config['UPSTREAM_MAX_ATTEMPTS']
+BREAKER_WINDOW = app.config['BREAKER_WINDOW']
+BREAKER_MIN_REQUESTS = app.config['BREAKER_MIN_REQUESTS']
+BREAKER_FAILURE_RATE = app.config['BREAKER_FAILURE_RATE']
+BREAKER_SLOW_CALL_SECONDS = app.config['BREAKER_SLOW_CALL_SECONDS']
+BREAKER_OPEN_SECONDS = app.config['BREAKER_OPEN_SECONDS']
+NEGATIVE_CACHE_TTL = app.config['NEGATIVE_CACHE_TTL']
+STALE_CACHE_MAX_AGE = app.config['STALE_CACHE_MAX_AGE']
+ADMISSION_MAX_CONCURRENT = app.config['ADMISSION_MAX_CONCURRENT']
+ADMISSION_MAX_QUEUE = app.config['ADMISSION_MAX_QUEUE']
+ADMISSION_QUEUE_TIMEOUT = app.config['ADMISSION_QUEUE_TIMEOUT']
+ADMISSION_RETRY_AFTER = app.config['ADMISSION_RETRY_AFTER']
+
+# タイトルのインターンテーブル（全ページの発リンク先インデックスで共有）
+class InternTable:
+    """タイトルとIDの対応表（上限を超えたら作り直すため、インデックスはどの表で作ったかを持つ）"""
+    __slots__ = ('ids', 'names')
+
+    def __init__(self):
+        self.ids = {}    # タイトル -> ID
+        self.names = []  # ID -> タイトル
+
+intern_table = InternTable()
+title_lock = threading.Lock()
+intern_rebuild_lock = threading.Lock()
+TITLE_INTERN_MAX = app.config['TITLE_INTERN_MAX']
+intern_stats = {'rebuilds': 0, 'swept_links': 0, 'rebuild_at': TITLE_INTERN_MAX}
+
+# HTML加工用プロセスプールの設定（0で無効、ワーカー内のスレッドで処理）
+HTML_PROCESS_POOL_SIZE = app.config['HTML_PROCESS_POOL_SIZE']
+HTML_POOL_TIMEOUT = app.config['HTML_POOL_TIMEOUT']
+HTML_POOL_LATE_TIMEOUT = app.config['HTML_POOL_LATE_TIMEOUT']
+html_pool = None  # 起動時（またはgunicornのpost_fork）にだけ作成し、壊れたら以後はスレッドで処理する
+html_pool_lock = threading.Lock()
+html_pool_slots = threading.BoundedSemaphore(max(HTML_PROCESS_POOL_SIZE + app.config['HTML_POOL_QUEUE_SIZE'], 1))
+html_pool_stats = {'submitted': 0, 'completed': 0, 'in_flight': 0, 'rejected': 0, 'timeouts': 0, 'late': 0,
+                   'abandoned': 0, 'errors': 0, 'broken': 0}
 
 # セキュリティ関数
 def sanitize_input(text):
@@ -138,43 +258,472 @@ def log_security_event(event_type, details, ip_address=None):
     
     logger.warning(f"SECURITY_EVENT: {event_type} - IP: {ip_address} - Details: {details}")
 
+def normalize_title(title):
+    """
+    ページタイトルを正規化する
+    - アンダースコアを空白に置換し、連続する空白をまとめる
+    - アンカー（#以降）を除去
+    - 先頭の英字を大文字化（MediaWikiの仕様に合わせる）
+    """
+    title = title.split('#', 1)[0].replace('_', ' ')
+    title = ' '.join(title.split())
+    if title:
+        title = title[0].upper() + title[1:]
+    return title
+
+def resolve_title(title):
+    """正規化したタイトルを、既知のリダイレクト情報に基づいて正規タイトルに変換する"""
+    title = normalize_title(title)
+    return title_aliases.get(title, title)
+
+def record_title_aliases(requested_title, data):
+    """
+    APIレスポンスのリダイレクト・正規化情報（parse.title、parse.redirects）を別名マップに記録する
+    別名マップはTITLE_ALIAS_MAX件を上限とし、古いものから破棄する
+    """
+    parse = data.get('parse') or {}
+    canonical = parse.get('title')
+    if not canonical:
+        return
+    canonical = normalize_title(canonical)
+    aliases = [requested_title] + [redirect.get('from', '') for redirect in parse.get('redirects', [])]
+    with title_alias_lock:
+        for alias in aliases:
+            alias = normalize_title(alias)
+            if alias and alias != canonical:
+                title_aliases[alias] = canonical
+                title_aliases.move_to_end(alias)
+        while len(title_aliases) > TITLE_ALIAS_MAX:
+            title_aliases.popitem(last=False)
+
 def get_cache_key(page_title):
-    """キャッシュキーを生成"""
-    return hashlib.md5(page_title.encode('utf-8')).hexdigest()
+    """キャッシュキーを生成（全キャッシュ層で正規タイトルをキーにする）"""
+    return resolve_title(page_title)
+
+def store_bounded(cache, key, value, max_entries):
+    """キャッシュに保存し、件数が上限を超えたら古く保存したものから捨てる"""
+    cache[key] = value
+    with cache_evict_lock:
+        try:
+            cache.move_to_end(key)
+        except KeyError:
+            # 他のスレッドが掃除で消した
+            pass
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+            cache_sweep_stats['evicted'] += 1
+
+def sweep_caches():
+    """期限切れのエントリーをまとめて捨てる（同じページが再び読まれるまで残り続けないように）"""
+    now = time.time()
+    expired = [
+        (page_cache, lambda entry: now - entry[1] >= STALE_CACHE_MAX_AGE),
+        (section_cache, lambda entry: now - entry[1] >= CACHE_EXPIRY),
+        (links_cache, lambda entry: now - entry[1] >= CACHE_EXPIRY),
+        (negative_cache, lambda entry: now - entry[2] >= NEGATIVE_CACHE_TTL),
+    ]
+    swept = 0
+    for cache, is_expired in expired:
+        for key, entry in list(cache.items()):
+            if is_expired(entry):
+                cache.pop(key, None)
+                swept += 1
+    # 版IDはキャッシュに残っているページの分だけ持つ
+    for key in list(page_revisions):
+        if key not in page_cache and key not in section_cache and key not in links_cache:
+            page_revisions.pop(key, None)
+    cache_sweep_stats['sweeps'] += 1
+    cache_sweep_stats['swept'] += swept
+    if swept:
+        logger.debug(f"Cache sweep: {swept} expired entries removed")
+
+def run_cache_sweeper():
+    """一定間隔で期限切れのキャッシュを掃除するバックグラウンドスレッド"""
+    while True:
+        time.sleep(CACHE_SWEEP_INTERVAL)
+        try:
+            sweep_caches()
+        except Exception as e:
+            logger.error(f"Cache sweep failed: {e}")
 
 def get_cached_page(page_title):
     """キャッシュからページデータを取得"""
     cache_key = get_cache_key(page_title)
-    if cache_key in page_cache:
-        cached_data, timestamp = page_cache[cache_key]
-        if time.time() - timestamp < CACHE_EXPIRY:
+    # 掃除のスレッドが同時に消すことがあるため、存在確認と取得を分けない
+    cached = page_cache.get(cache_key)
+    if cached is not None:
+        cached_data, timestamp = cached
+        age = time.time() - timestamp
+        if age < CACHE_EXPIRY:
             return cached_data
-        else:
-            # 期限切れのキャッシュを削除
-            del page_cache[cache_key]
+        elif age >= STALE_CACHE_MAX_AGE:
+            # 障害時にも使えないほど古いキャッシュを削除
+            page_cache.pop(cache_key, None)
+    return None
+
+def get_stale_page(page_title):
+    """期限切れでも障害時に使える範囲のキャッシュを取得"""
+    cached = page_cache.get(get_cache_key(page_title))
+    if cached and time.time() - cached[1] < STALE_CACHE_MAX_AGE:
+        return cached[0]
     return None
 
 def set_cached_page(page_title, data):
     """ページデータをキャッシュに保存"""
     cache_key = get_cache_key(page_title)
-    page_cache[cache_key] = (data, time.time())
+    store_bounded(page_cache, cache_key, (data, time.time()), PAGE_CACHE_MAX)
+    # 版IDはスナップショットの再検証に使う
+    revid = (data.get('parse') or {}).get('revid')
+    if revid:
+        page_revisions[cache_key] = revid
 
 def get_cached_links(page_title):
     """キャッシュから解析済みリンク情報を取得"""
     cache_key = get_cache_key(page_title)
-    if cache_key in links_cache:
-        cached_links, timestamp = links_cache[cache_key]
+    cached = links_cache.get(cache_key)
+    if cached is not None:
+        cached_links, timestamp = cached
         if time.time() - timestamp < CACHE_EXPIRY:
             return cached_links
         else:
             # 期限切れのキャッシュを削除
-            del links_cache[cache_key]
+            links_cache.pop(cache_key, None)
     return None
 
 def set_cached_links(page_title, links_data):
     """解析済みリンク情報をキャッシュに保存"""
     cache_key = get_cache_key(page_title)
     links_cache[cache_key] = (links_data, time.time())
+    if len(intern_table.names) > intern_stats['rebuild_at']:
+        rebuild_intern_table()
+
+def get_cached_sections(page_title):
+    """キャッシュからセクション分割済みの記事を取得"""
+    cache_key = get_cache_key(page_title)
+    cached = section_cache.get(cache_key)
+    if cached is not None:
+        cached_sections, timestamp = cached
+        if time.time() - timestamp < CACHE_EXPIRY:
+            return cached_sections
+        section_cache.pop(cache_key, None)
+    # キャッシュになければ、起動前に保存したスナップショットから復元する
+    return restore_from_snapshot(page_title)
+
+def set_cached_sections(page_title, sections):
+    """セクション分割済みの記事をキャッシュに保存"""
+    global cache_generation
+    store_bounded(section_cache, get_cache_key(page_title), (sections, time.time()), SECTION_CACHE_MAX)
+    cache_generation += 1
+
+def get_negative_cache(page_title):
+    """ネガティブキャッシュ（存在しないページ・取得失敗）を取得"""
+    cache_key = get_cache_key(page_title)
+    entry = negative_cache.get(cache_key)
+    if entry is not None:
+        if time.time() - entry[2] < NEGATIVE_CACHE_TTL:
+            return entry
+        negative_cache.pop(cache_key, None)
+    return None
+
+def set_negative_cache(page_title, data, reason):
+    """
+    ネガティブキャッシュに保存
+    - data: 存在しないページに対するAPIのレスポンス（取得失敗の場合はNone）
+    """
+    store_bounded(negative_cache, get_cache_key(page_title), (data, reason, time.time()), NEGATIVE_CACHE_MAX)
+
+class UpstreamError(Exception):
+    """Wikipedia APIへのリクエストが失敗した"""
+
+class CircuitOpenError(UpstreamError):
+    """サーキットブレーカーが開いているため上流を呼ばなかった"""
+
+class OverloadedError(UpstreamError):
+    """混雑のため上流へのリクエストを受け付けなかった（ロードシェディング）"""
+
+class CircuitBreaker:
+    """
+    ホスト単位のサーキットブレーカー
+    - 直近BREAKER_WINDOW秒の呼び出しのうち、エラーまたは低速呼び出しの割合で開閉を判定
+    - 開いている間は上流を呼ばずに即座に失敗させる
+    - BREAKER_OPEN_SECONDS経過後は1件だけ試行（半開）し、成功すれば閉じる
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.calls = deque()  # (時刻, 失敗扱いかどうか, 所要時間)
+        self.opened_at = None
+        self.probing = False
+        self.probe_thread = None  # 半開状態の試行を許可したスレッド
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < BREAKER_OPEN_SECONDS or self.probing:
+                return False
+            # 半開状態: 1件だけ試行を許可
+            self.probing = True
+            self.probe_thread = threading.get_ident()
+            return True
+
+    def release_probe(self):
+        """
+        半開状態の試行を上流を呼ばずに終えた場合（期限切れなど）に、次のリクエストが試行できるように戻す
+        （このスレッドに許可した試行でなければ何もしない）
+        """
+        with self.lock:
+            if self.probing and self.probe_thread == threading.get_ident():
+                self.probing = False
+
+    def record(self, success, elapsed):
+        now = time.monotonic()
+        failed = not success or elapsed >= BREAKER_SLOW_CALL_SECONDS
+        with self.lock:
+            if self.probing:
+                self.probing = False
+                if failed:
+                    self.opened_at = now
+                    logger.warning(f"Circuit breaker for {self.host} stays open")
+                else:
+                    self.opened_at = None
+                    self.calls.clear()
+                    logger.info(f"Circuit breaker for {self.host} closed")
+                return
+
+            self.calls.append((now, failed, elapsed))
+            while self.calls and now - self.calls[0][0] > BREAKER_WINDOW:
+                self.calls.popleft()
+
+            if self.opened_at is None and len(self.calls) >= BREAKER_MIN_REQUESTS:
+                failures = sum(1 for call in self.calls if call[1])
+                if failures / len(self.calls) >= BREAKER_FAILURE_RATE:
+                    self.opened_at = now
+                    logger.warning(f"Circuit breaker for {self.host} opened ({failures}/{len(self.calls)} failed or slow)")
+
+    def stats(self):
+        """状態と直近の統計を返す"""
+        with self.lock:
+            calls = list(self.calls)
+            state = 'closed' if self.opened_at is None else ('half-open' if self.probing else 'open')
+        latencies = sorted(call[2] for call in calls)
+        return {
+            'state': state,
+            'calls': len(calls),
+            'failures': sum(1 for call in calls if call[1]),
+            'p50_latency': latencies[len(latencies) // 2] if latencies else None,
+            'max_latency': latencies[-1] if latencies else None,
+        }
+
+class AdmissionGate:
+    """
+    上流へのリクエストの流量制御
+    - 同時にADMISSION_MAX_CONCURRENT件まで上流を呼び、それ以上は空きを待つ
+    - 待機中がADMISSION_MAX_QUEUE件を超える場合や、期限までに空かない場合は即座に断る（OverloadedError）
+    - キャッシュヒットはここを通らないため、混雑中もキャッシュ済みのページは速く返せる
+    """
+
+    def __init__(self, max_concurrent, max_queue, queue_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+        self.stats_counts = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_timeout': 0,
+                             'shed_on_arrival': 0, 'peak_waiting': 0}
+
+    def acquire(self, deadline):
+        """空きを取得する。deadline（time.monotonic()の値）とADMISSION_QUEUE_TIMEOUTの早い方まで待つ"""
+        with self.condition:
+            if self.active < self.max_concurrent and self.waiting == 0:
+                self.active += 1
+                self.stats_counts['admitted'] += 1
+                return
+            if self.waiting >= self.max_queue:
+                self.stats_counts['shed_queue_full'] += 1
+                raise OverloadedError(f"Upstream queue full ({self.waiting} waiting)")
+
+            wait_until = min(deadline, time.monotonic() + self.queue_timeout)
+            self.waiting += 1
+            self.stats_counts['queued'] += 1
+            self.stats_counts['peak_waiting'] = max(self.stats_counts['peak_waiting'], self.waiting)
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = wait_until - time.monotonic()
+                    if remaining <= 0:
+                        self.stats_counts['shed_timeout'] += 1
+                        raise OverloadedError("Timed out waiting for an upstream slot")
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.stats_counts['admitted'] += 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def should_shed(self):
+        """
+        空きがなく待機列も一杯なら、受付の時点で断る（断った件数も数える）
+        上流の取得が必要なリクエストについて、処理を始める前に呼ぶ
+        """
+        with self.condition:
+            if self.active >= self.max_concurrent and self.waiting >= self.max_queue:
+                self.stats_counts['shed_on_arrival'] += 1
+                return True
+            return False
+
+    def stats(self):
+        """現在の同時実行数・待機数と累計の統計を返す"""
+        with self.condition:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                **self.stats_counts,
+            }
+
+admission_gate = AdmissionGate(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+
+# 混雑時に返すメッセージ
+BUSY_MESSAGE = '混雑しています。しばらくしてから再度お試しください。'
+
+def is_page_available(page_title):
+    """上流を呼ばずに返せる（キャッシュ・期限切れキャッシュ・スナップショットにある）かどうか"""
+    return (get_cached_links(page_title) is not None
+            or get_cached_sections(page_title) is not None
+            or get_stale_page(page_title) is not None)
+
+def busy_json_response():
+    """混雑時のJSON応答（503 + Retry-After）"""
+    response = jsonify({'status': 'busy', 'message': BUSY_MESSAGE})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER)
+    return response
+
+def get_circuit_breaker(url):
+    """URLのホストに対応するサーキットブレーカーを返す"""
+    host = urlparse(url).netloc
+    breaker = circuit_breakers.get(host)
+    if breaker is None:
+        breaker = circuit_breakers.setdefault(host, CircuitBreaker(host))
+    return breaker
+
+def wiki_get(params):
+    """
+    Wikipedia APIを呼び出してJSONを返す
+    - リトライを含めた全体の期限（UPSTREAM_DEADLINE）を守る
+    - サーキットブレーカーが開いている場合は即座にUpstreamErrorを送出
+    - 同時リクエスト数が上限の場合は期限内で空きを待ち、待てなければOverloadedErrorを送出
+    """
+    # 空きを待つ時間も全体の期限に含める
+    deadline = time.monotonic() + UPSTREAM_DEADLINE
+    admission_gate.acquire(deadline)
+    try:
+        # ブレーカーの確認は空きを取得した後に行う（半開の試行が流量制御で断られて残らないように）
+        breaker = get_circuit_breaker(WIKI_API_URL)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit breaker open for {breaker.host}")
+        return call_upstream(breaker, params, deadline)
+    finally:
+        admission_gate.release()
+
+def call_upstream(breaker, params, deadline):
+    """期限内でリトライしながら上流を呼び出す（wiki_getから流量制御の内側で呼ばれる）"""
+    last_error = None
+    attempted = False
+    try:
+        for attempt in range(UPSTREAM_MAX_ATTEMPTS):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0.05:
+                break
+            attempted = True
+            started = time.monotonic()
+            try:
+                response = get_session().get(WIKI_API_URL, params=params, timeout=remaining)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise UpstreamError(f"Status code: {response.status_code}")
+                data = response.json()
+            except Exception as e:
+                breaker.record(False, time.monotonic() - started)
+                last_error = e
+                logger.debug(f"wiki_get attempt {attempt + 1} failed: {e}")
+                # 半開状態の試行に失敗した場合はリトライしない
+                if not breaker.allow_request():
+                    break
+                continue
+            breaker.record(True, time.monotonic() - started)
+            return data
+    finally:
+        # 一度も上流を呼ばなかった場合、半開状態の試行を持ったままにしない
+        if not attempted:
+            breaker.release_probe()
+
+    raise UpstreamError(f"Wikipedia API request failed: {last_error or 'deadline exceeded'}")
+
+def build_parse_params(page_title):
+    """ページ本文取得用のパラメータ（軽量化オプション付き）"""
+    return {
+        'action': 'parse',
+        'page': page_title,
+        'format': 'json',
+        'prop': 'text',
+        'redirects': 1,
+        'disableeditsection': 1,  # 編集セクションを無効化してレスポンスを軽量化
+        'disabletoc': 1,  # 目次を無効化
+        'disablelimitreport': 1,  # 制限レポートを無効化
+        'disablepp': 1  # 前処理を無効化
+    }
+
+def fetch_page_data(page_title):
+    """
+    ページデータを取得する
+    - キャッシュ → ネガティブキャッシュ → 上流 の順に確認
+    - 上流が失敗した場合は期限切れキャッシュを返す（serve-stale）
+    - 存在しないページ・取得失敗は短時間ネガティブキャッシュする
+    """
+    cached_data = get_cached_page(page_title)
+    if cached_data:
+        logger.debug(f"Using cached data for page: {page_title}")
+        return cached_data
+
+    negative = get_negative_cache(page_title)
+    if negative is not None:
+        data, reason, _ = negative
+        if data is not None:
+            return data
+        stale = get_stale_page(page_title)
+        if stale:
+            return stale
+        raise UpstreamError(f"Recently failed: {reason}")
+
+    try:
+        data = wiki_get(build_parse_params(page_title))
+        # リダイレクト・正規化情報を記録してからキャッシュする（正規タイトルをキーにするため）
+        record_title_aliases(page_title, data)
+    except UpstreamError as e:
+        stale = get_stale_page(page_title)
+        if stale:
+            logger.warning(f"Serving stale page for {page_title}: {e}")
+            return stale
+        # 遮断中・混雑中はページの問題ではないので、ページ単位のネガティブキャッシュは不要
+        if not isinstance(e, (CircuitOpenError, OverloadedError)):
+            set_negative_cache(page_title, None, str(e))
+        raise
+
+    if 'parse' not in data:
+        # 存在しないページなどのエラーレスポンス
+        set_negative_cache(page_title, data, data.get('error', {}).get('code', 'missing'))
+        return data
+
+    # データをキャッシュに保存
+    set_cached_page(page_title, data)
+    return data
 
 def optimize_html_content(parsed_html):
     """
@@ -185,145 +734,281 @@ def optimize_html_content(parsed_html):
     # 最適化が無効化されている場合はそのまま返す
     if not app.config.get('ENABLE_HTML_OPTIMIZATION', True):
         return parsed_html
-    
-    soup = BeautifulSoup(parsed_html, 'lxml')
-    
-    # タグ名で削除する要素（高速）
-    tags_to_remove = ['style', 'script', 'noscript', 'iframe', 'embed', 'object']
-    for tag_name in tags_to_remove:
-        for tag in soup.find_all(tag_name):
-            tag.decompose()
-    
-    # CSSセレクタで削除する要素
-    selectors_to_remove = [
-        '.mw-editsection',    # 編集セクション
-        '.mw-jump-link',      # ジャンプリンク
-        '.reference',         # 参考文献
-        '.mw-cite-backlink',  # 引用リンク
-        '.noprint',           # 印刷しない要素
-        '.ambox',             # メッセージボックス
-        '.navbox',            # ナビゲーションボックス
-        '.sistersitebox',     # 姉妹サイトボックス
-        '.metadata',          # メタデータ
-        '.catlinks',          # カテゴリリンク
-        '.reflist',           # 参考文献リスト
-        '.thumb',             # サムネイル画像
-        '.gallery',           # ギャラリー
-        '.toc',               # 目次
-        '.infobox',           # インフォボックス（表が大きいため）
-        '.sidebar',           # サイドバー
-        '.navbox-inner',      # ナビボックスの内部
-        '.refbegin',          # 参考文献の開始
-        '.portalbox',         # ポータルボックス
-        '.hatnote',           # ヘッドノート
-        '.dablink',           # 曖昧さ回避リンク
-        '.rellink',           # 関連リンク
-        '.mainarticle',       # メイン記事
-        '#toc',               # 目次のID
-        'table',              # すべてのテーブル（大きいため）
-        'sup.reference',      # 上付き参照
-        'ol.references',      # 参考文献のリスト
-    ]
-    
-    for selector in selectors_to_remove:
-        for element in soup.select(selector):
-            element.decompose()
-    
-    # 外部リンクを完全に削除（設定で制御）
-    if app.config.get('REMOVE_EXTERNAL_LINKS', True):
-        for a in soup.find_all('a', href=True):
-            href = a.get('href', '')
-            # Wikipedia内のリンク以外を削除
-            if not href.startswith('/wiki/'):
-                a.decompose()
-    
-    # 画像の遅延読み込み属性を追加（オプション）
-    for img in soup.find_all('img'):
-        img['loading'] = 'lazy'
-        # srcset属性を削除（複数解像度の画像を削除）
-        if 'srcset' in img.attrs:
-            del img['srcset']
-    
-    # 不要な属性を削除（リンク以外）
-    for element in soup.find_all():
-        # リンク要素のhref属性は保持
-        if element.name == 'a':
-            attrs_to_keep = ['href', 'title']
-        # 画像要素のsrc属性は保持
-        elif element.name == 'img':
-            attrs_to_keep = ['src', 'alt', 'loading']
-        else:
-            attrs_to_keep = []
-        
-        # 不要な属性を削除
-        attrs = list(element.attrs.keys())
-        for attr in attrs:
-            if attr not in attrs_to_keep:
-                del element.attrs[attr]
-    
-    # HTMLを文字列に変換
-    html_str = str(soup)
-    
-    # HTMLの圧縮（minification）
-    if app.config.get('ENABLE_HTML_COMPRESSION', True):
-        # 連続する空白を単一の空白に置換
-        html_str = re.sub(r'\s+', ' ', html_str)
-        # タグ間の空白を削除
-        html_str = re.sub(r'>\s+<', '><', html_str)
-        # タグ後の空白を削除
-        html_str = re.sub(r'>\s+', '>', html_str)
-        # タグ前の空白を削除
-        html_str = re.sub(r'\s+<', '<', html_str)
-    
+
+    from html_optimizer import optimize_html
+
+    html_str = optimize_html(parsed_html,
+                             remove_external_links=app.config.get('REMOVE_EXTERNAL_LINKS', True),
+                             enable_compression=app.config.get('ENABLE_HTML_COMPRESSION', True))
+
     logger.debug(f"HTML optimized: Original size ~ {len(parsed_html)} bytes, Optimized size ~ {len(html_str)} bytes")
-    
+
     return html_str
 
-def process_links_in_html(parsed_html, page_title, target_title, clicks_remaining, difficulty, start_time):
-    """HTML内のリンクを処理してURLを書き換える"""
-    # リンク情報キャッシュをチェック
-    cached_links = get_cached_links(page_title)
-    if cached_links:
+def process_article_inline(parsed_html):
+    """生の記事HTMLをこのスレッドで最適化・セクション分割する"""
+    from html_optimizer import split_sections
+    return split_sections(optimize_html_content(parsed_html))
+
+class HtmlPoolTimeout(Exception):
+    """プロセスプールでの記事の加工が期限を大きく過ぎても終わらなかった"""
+
+def start_html_pool():
+    """
+    HTML加工用のプロセスプールを起動する
+    spawn/forkserverでは子プロセスが__main__（main.py）を再実行してしまうためforkを使う。
+    forkはスレッドが動いていない時点で行う必要があるので、モジュールの読み込み時（またはgunicornのpost_fork）だけから呼ぶ。
+    リクエスト処理中には作り直さない
+    """
+    global html_pool
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    pool = ProcessPoolExecutor(max_workers=HTML_PROCESS_POOL_SIZE,
+                               mp_context=multiprocessing.get_context('fork'))
+    # forkの場合は最初のsubmitで全ワーカーが起動するので、ここで起動させておく
+    pool.submit(int).result()
+    atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+    html_pool = pool
+    logger.info(f"HTML process pool started with {HTML_PROCESS_POOL_SIZE} workers")
+
+def disable_html_pool(reason):
+    """壊れたプールを破棄し、以後はリクエストのスレッドで処理する（作り直しはしない）"""
+    global html_pool
+    with html_pool_lock:
+        pool, html_pool = html_pool, None
+        if pool is None:
+            return
+        html_pool_stats['broken'] += 1
+    logger.error(f"HTML process pool disabled, processing inline from now on: {reason}")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def reset_html_pool_after_fork():
+    """fork後の子プロセスでは親のプールは使えないので破棄する（gunicornではpost_forkで作り直す）"""
+    global html_pool, html_pool_lock
+    html_pool = None
+    html_pool_lock = threading.Lock()
+
+def count_html_pool(key):
+    """プロセスプールのメトリクスを加算"""
+    with html_pool_lock:
+        html_pool_stats[key] += 1
+
+def release_html_pool_slot(future):
+    """タスク完了時にキューの枠を返却する"""
+    html_pool_slots.release()
+    with html_pool_lock:
+        html_pool_stats['in_flight'] -= 1
+
+# HTML加工用プロセスプールは、リクエスト処理のスレッドが動き出す前に起動しておく
+if HTML_PROCESS_POOL_SIZE > 0:
+    os.register_at_fork(after_in_child=reset_html_pool_after_fork)
+    start_html_pool()
+
+def process_article_html(parsed_html):
+    """
+    生の記事HTMLを最適化・セクション分割する
+    - プロセスプールが有効なら別プロセスで実行し、GILによる直列化を避ける
+    - キューが埋まっている、期限までに処理が始まらない、プールが壊れた場合はこのスレッドで処理する
+    - 期限はキューでの待ち時間と処理時間をまとめたもの。期限を過ぎても既に処理中なら二重に処理せず、
+      さらにHTML_POOL_LATE_TIMEOUT秒まで結果を待つ（それでも終わらなければHtmlPoolTimeout）
+    """
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+    from concurrent.futures.process import BrokenProcessPool
+
+    options = (
+        app.config.get('ENABLE_HTML_OPTIMIZATION', True),
+        app.config.get('REMOVE_EXTERNAL_LINKS', True),
+        app.config.get('ENABLE_HTML_COMPRESSION', True),
+    )
+    pool = html_pool
+    if pool is None:
+        return process_article_inline(parsed_html)
+
+    started = time.monotonic()
+    # バックプレッシャー: 実行中＋待機中のタスク数を制限する（空きがなければ待たずにこのスレッドで処理）
+    if not html_pool_slots.acquire(blocking=False):
+        count_html_pool('rejected')
+        return process_article_inline(parsed_html)
+
+    try:
+        from html_optimizer import process_article
+        future = pool.submit(process_article, parsed_html, *options)
+    except Exception as e:
+        html_pool_slots.release()
+        count_html_pool('errors')
+        logger.error(f"HTML process pool submit failed: {e}")
+        disable_html_pool(e)
+        return process_article_inline(parsed_html)
+
+    with html_pool_lock:
+        html_pool_stats['submitted'] += 1
+        html_pool_stats['in_flight'] += 1
+    future.add_done_callback(release_html_pool_slot)
+
+    try:
+        try:
+            sections = future.result(timeout=max(started + HTML_POOL_TIMEOUT - time.monotonic(), 0))
+        except FutureTimeoutError:
+            # まだキューで待っていれば取り消してこのスレッドで処理する
+            if future.cancel():
+                count_html_pool('timeouts')
+                return process_article_inline(parsed_html)
+            # 既に処理中のタスクは止められないので、やり直さずに結果を待つ（待つのは一定時間まで）
+            count_html_pool('late')
+            try:
+                sections = future.result(timeout=HTML_POOL_LATE_TIMEOUT)
+            except FutureTimeoutError:
+                count_html_pool('abandoned')
+                raise HtmlPoolTimeout(f"HTML processing did not finish within {HTML_POOL_TIMEOUT + HTML_POOL_LATE_TIMEOUT:.1f}s")
+    except HtmlPoolTimeout:
+        raise
+    except Exception as e:
+        count_html_pool('errors')
+        logger.error(f"HTML process pool task failed: {e}")
+        if isinstance(e, BrokenProcessPool):
+            disable_html_pool(e)
+        return process_article_inline(parsed_html)
+
+    count_html_pool('completed')
+    logger.debug(f"HTML processed in pool: {len(parsed_html)} bytes in {time.monotonic() - started:.3f}s")
+    return sections
+
+def get_link_title(link):
+    """ゲームで辿れる/wiki/リンクからページタイトルを取り出す（対象外の場合はNone）"""
+    if not link.startswith('/wiki/'):
+        return None
+    if any(link.startswith(prefix) for prefix in EXCLUDED_PREFIXES):
+        return None
+    return normalize_title(unquote(link[len('/wiki/'):]))
+
+def intern_title(title, table):
+    """タイトルをインターンテーブルに登録してIDを返す"""
+    title_id = table.ids.get(title)
+    if title_id is None:
+        with title_lock:
+            title_id = table.ids.get(title)
+            if title_id is None:
+                title = sys.intern(title)
+                title_id = len(table.names)
+                table.names.append(title)
+                table.ids[title] = title_id
+    return title_id
+
+def rebuild_intern_table():
+    """
+    インターンテーブルが上限を超えたら、期限切れの発リンク先インデックスを捨て、
+    生きているインデックスだけで新しい表を作り直す（古い表は参照がなくなれば解放される）
+    """
+    global intern_table
+    with intern_rebuild_lock:
+        if len(intern_table.names) <= intern_stats['rebuild_at']:
+            return
+        now = time.time()
+        table = InternTable()
+        swept = 0
+        for key, (outlinks, timestamp) in list(links_cache.items()):
+            if now - timestamp >= CACHE_EXPIRY:
+                links_cache.pop(key, None)
+                swept += 1
+                continue
+            links_cache[key] = (OutlinkIndex(outlinks.titles, table), timestamp)
+        intern_table = table
+        # 生きているインデックスだけで上限近くまで埋まっている場合に毎回作り直さないよう、次の作り直しまでの余裕を取る
+        intern_stats['rebuild_at'] = max(TITLE_INTERN_MAX, 2 * len(table.names))
+        intern_stats['rebuilds'] += 1
+        intern_stats['swept_links'] += swept
+        logger.info(f"Intern table rebuilt: {len(table.names)} titles kept, {swept} expired link indexes swept")
+
+class OutlinkIndex:
+    """
+    ページの発リンク先インデックス
+    - リンク先タイトルをインターン済みIDのソート済み配列で保持
+    - 所属判定は二分探索（O(log n)）
+    - titlesはAPIレスポンス用にそのまま返せる不変タプル
+    """
+    __slots__ = ('ids', 'titles', 'table')
+
+    def __init__(self, titles, table=None):
+        # 作り直しの途中でも判定が狂わないように、作ったときの表を持っておく
+        self.table = table or intern_table
+        ids = sorted({intern_title(title, self.table) for title in titles})
+        self.ids = array('L', ids)
+        self.titles = tuple(self.table.names[title_id] for title_id in ids)
+
+    def __contains__(self, title):
+        title_id = self.table.ids.get(title)
+        if title_id is None:
+            return False
+        i = bisect_left(self.ids, title_id)
+        return i < len(self.ids) and self.ids[i] == title_id
+
+    def __len__(self):
+        return len(self.ids)
+
+def build_outlink_index(parsed_html, page_title):
+    """最適化済みHTMLから発リンク先インデックスを作成してキャッシュする"""
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    only_links = SoupStrainer('a')
+    soup = BeautifulSoup(parsed_html, 'lxml', parse_only=only_links)
+    current_title = resolve_title(page_title)
+    titles = []
+    for a in soup.find_all('a', href=True):
+        title = get_link_title(a['href'])
+        # 現在のページへのリンク（リダイレクト経由を含む）はスキップ
+        if title and resolve_title(title) != current_title:
+            titles.append(title)
+
+    outlinks = OutlinkIndex(titles)
+    set_cached_links(page_title, outlinks)
+    return outlinks
+
+def get_outlink_index(parsed_html, page_title):
+    """発リンク先インデックスを取得（キャッシュがなければ作成）"""
+    outlinks = get_cached_links(page_title)
+    if outlinks is None:
+        outlinks = build_outlink_index(parsed_html, page_title)
+    else:
         logger.debug(f"Using cached links for page: {page_title}")
-        # キャッシュされたリンク情報を使用してHTMLを再構築
-        soup = BeautifulSoup(parsed_html, 'lxml')
-        for a in soup.find_all('a', href=True):
-            link = a['href']
-            if link.startswith('/wiki/'):
-                title = link.replace('/wiki/', '')
-                title = unquote(title).strip()
-                
-                # キャッシュされたリンク情報からページタイトルを確認
-                if title in cached_links:
-                    # 現在のクリック数に基づいてURLを動的生成
-                    new_clicks = clicks_remaining - 1
-                    
-                    if title == target_title:
-                        # ターゲットページへのリンクはクリック数に関係なく飛べる
-                        a['href'] = url_for('game', page=title, clicks=new_clicks,
-                                          mytarget=target_title, difficulty=difficulty,
-                                          start_time=start_time)
-                    elif new_clicks <= 0:
-                        a['href'] = url_for('game_over')
-                    else:
-                        a['href'] = url_for('game', page=title, clicks=new_clicks,
-                                          mytarget=target_title, difficulty=difficulty,
-                                          start_time=start_time)
-                else:
-                    # キャッシュにないリンクは無効化
-                    a['href'] = 'javascript:void(0);'
-                    a['onclick'] = 'alert("このリンクは使用できません。"); return false;'
-                    a['style'] = 'color: #999; cursor: not-allowed;'
-        
-        return f'<div id="mw-content-text">{str(soup)}</div>'
-    
-    # キャッシュがない場合は従来通り処理
+    return outlinks
+
+def is_linked_from(prev_title, page_title):
+    """
+    page_titleがprev_titleからリンクされているかを検証する
+    検証に必要なデータがキャッシュにない場合はNoneを返す（上流への取得は行わない）
+    """
+    outlinks = get_cached_links(prev_title)
+    if outlinks is None:
+        if get_cached_sections(prev_title) is None:
+            cached_data = get_cached_page(prev_title)
+            if not cached_data or 'parse' not in cached_data:
+                return None
+        # キャッシュ済みのデータからインデックスを作り直す
+        get_article_sections(prev_title)
+        outlinks = get_cached_links(prev_title)
+        if outlinks is None:
+            return None
+    return page_title in outlinks
+
+def process_links_in_html(parsed_html, page_title, target_title, clicks_remaining, difficulty, start_time, fragment=False):
+    """
+    HTML内のリンクを処理してURLを書き換える
+    fragment=Trueなら記事本文の枠（mw-content-text）で包まず、中身だけを返す（遅延読み込みのセクション用）
+    """
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(parsed_html, 'lxml')
-    links_data = {}  # キャッシュ用のリンク情報
-    
+
+    # 発リンク先インデックスがなければ、この解析結果から作成する
+    outlinks = get_cached_links(page_title)
+    found_titles = [] if outlinks is None else None
+    new_clicks = clicks_remaining - 1
+    current_title = resolve_title(page_title)
+
     for a in soup.find_all('a', href=True):
         link = a['href']
-        
+
         # Wikipedia内のリンクのみを許可
         if not link.startswith('/wiki/'):
             # 外部リンクの場合はクリックを無効化
@@ -333,114 +1018,265 @@ def process_links_in_html(parsed_html, page_title, target_title, clicks_remainin
             continue
 
         # 除外プレフィックスのチェック
-        if any(link.startswith(prefix) for prefix in EXCLUDED_PREFIXES):
+        title = get_link_title(link)
+        if title is None:
             # 除外されたリンクもクリックを無効化
             a['href'] = 'javascript:void(0);'
             a['onclick'] = 'alert("このリンクは使用できません。"); return false;'
             a['style'] = 'color: #999; cursor: not-allowed; text-decoration: line-through;'
             continue
 
-        title = link.replace('/wiki/', '')
-        title = unquote(title).strip()
-
-        # 現在のページへのリンクは無効化
-        if title == page_title:
+        # 現在のページへのリンク（リダイレクト経由を含む）は無効化
+        if resolve_title(title) == current_title:
             a['href'] = 'javascript:void(0);'
             a['onclick'] = 'alert("現在のページです。"); return false;'
             a['style'] = 'color: #999; cursor: not-allowed;'
             continue
 
-        new_clicks = clicks_remaining - 1
+        if found_titles is not None:
+            found_titles.append(title)
+        elif title not in outlinks:
+            # インデックスにないリンクは無効化
+            a['href'] = 'javascript:void(0);'
+            a['onclick'] = 'alert("このリンクは使用できません。"); return false;'
+            a['style'] = 'color: #999; cursor: not-allowed;'
+            continue
 
-        if title == target_title:
+        if title == target_title or new_clicks > 0:
             # ターゲットページへのリンクはクリック数に関係なく飛べる
-            new_url = url_for('game', page=title, clicks=new_clicks,
-                            mytarget=target_title, difficulty=difficulty,
-                            start_time=start_time)
-            a['href'] = new_url
-            links_data[title] = new_url
-        elif new_clicks <= 0:
-            a['href'] = url_for('game_over')
-            links_data[title] = url_for('game_over')
+            # prevは遷移元ページで、サーバー側の遷移検証に使う
+            a['href'] = url_for('game', page=title, clicks=new_clicks,
+                                mytarget=target_title, difficulty=difficulty,
+                                start_time=start_time, prev=page_title)
         else:
-            new_url = url_for('game', page=title, clicks=new_clicks,
-                            mytarget=target_title, difficulty=difficulty,
-                            start_time=start_time)
-            a['href'] = new_url
-            links_data[title] = new_url
-    
+            a['href'] = url_for('game_over')
+
     # リンク情報をキャッシュに保存
-    set_cached_links(page_title, links_data)
-    
+    if found_titles is not None:
+        set_cached_links(page_title, OutlinkIndex(found_titles))
+
+    if fragment:
+        return ''.join(str(child) for child in (soup.body or soup).contents)
     return f'<div id="mw-content-text">{str(soup)}</div>'
 
-def process_links_for_api(parsed_html, page_title, target_title, clicks_remaining, difficulty, start_time):
-    """API用の軽量版リンク処理（リンク情報のみを返す）"""
-    # リンク情報キャッシュをチェック
-    cached_links = get_cached_links(page_title)
-    if cached_links:
-        logger.debug(f"Using cached links for API: {page_title}")
-        # キャッシュされたリンク情報からAPI用のデータを構築
-        links = []
-        for title in cached_links.keys():
-            if title != page_title:  # 現在のページへのリンクは除外
-                new_clicks = clicks_remaining - 1
-                links.append({
-                    'title': title,
-                    'href': f'/wiki/{title}',
-                    'clicks': new_clicks
-                })
-        return links[:50]  # 最初の50個のリンクのみ返す
-    
-    # キャッシュがない場合は従来通り処理
-    only_links = SoupStrainer('a')
-    soup = BeautifulSoup(parsed_html, 'lxml', parse_only=only_links)
-    links = []
-    links_data = {}  # キャッシュ用のリンク情報
-    
-    for a in soup.find_all('a', href=True):
-        link = a['href']
-        
-        # Wikipedia内のリンクのみを許可
-        if not link.startswith('/wiki/'):
+def get_article_sections(page_title):
+    """
+    最適化・セクション分割済みの記事を取得する（キャッシュがなければ作成）
+    発リンク先インデックスも記事全体から作成しておき、セクション単位のリンク処理で使う
+    """
+    sections = get_cached_sections(page_title)
+    if sections is None:
+        # ページデータの取得（キャッシュ・耐障害性レイヤー経由）
+        data = fetch_page_data(page_title)
+
+        if 'parse' not in data:
+            raise KeyError("'parse' キーがレスポンスに存在しません。")
+
+        sections = store_article(page_title, data)
+
+    # セクション単体から作ると不完全になるため、インデックスは記事全体から作る
+    if get_cached_links(page_title) is None:
+        build_outlink_index(''.join(section_html for _, section_html in sections), page_title)
+    return sections
+
+def store_article(page_title, data):
+    """APIレスポンスの記事を加工し、セクションと発リンク先インデックスのキャッシュに保存する"""
+    # HTMLコンテンツの最適化（不要な要素を削除）とセクション分割
+    sections = process_article_html(data['parse']['text']['*'])
+    set_cached_sections(page_title, sections)
+    build_outlink_index(''.join(section_html for _, section_html in sections), page_title)
+    return sections
+
+def get_snapshot_reader():
+    """キャッシュスナップショットを読み込む（初回呼び出し時にヘッダーとインデックスだけを読む）"""
+    global snapshot_reader, snapshot_loaded
+    if snapshot_loaded:
+        return snapshot_reader
+    with snapshot_lock:
+        if not snapshot_loaded:
+            readers = []
+            if CACHE_SNAPSHOT_PATH:
+                from cache_snapshot import SnapshotReader, find_snapshots
+
+                # ワーカーごとのファイルをまとめて読む（壊れたファイルは飛ばす）
+                for path in find_snapshots(CACHE_SNAPSHOT_PATH):
+                    try:
+                        readers.append(SnapshotReader(path))
+                    except Exception as e:
+                        logger.error(f"Failed to load cache snapshot {path}: {e}")
+            if readers:
+                try:
+                    from cache_snapshot import MergedSnapshotReader
+
+                    reader = MergedSnapshotReader(readers)
+                    # 別名マップも復元しておく（正規タイトルでスナップショットを引けるように）
+                    with title_alias_lock:
+                        for alias, canonical in reader.aliases.items():
+                            title_aliases.setdefault(alias, canonical)
+                        while len(title_aliases) > TITLE_ALIAS_MAX:
+                            title_aliases.popitem(last=False)
+                    snapshot_reader = reader
+                    logger.info(f"Cache snapshot loaded: {len(reader)} entries from {len(readers)} files")
+                except Exception as e:
+                    logger.error(f"Failed to load cache snapshot: {e}")
+            snapshot_loaded = True
+    return snapshot_reader
+
+def restore_from_snapshot(page_title):
+    """
+    スナップショットから記事を復元してキャッシュに戻す
+    古いエントリーはそのまま返し、バックグラウンドで再検証する（stale-while-revalidate）
+    """
+    reader = get_snapshot_reader()
+    if reader is None:
+        return None
+    # 別名マップはスナップショットの読み込み時に復元されるので、読み込み後に正規タイトルを引く
+    cache_key = get_cache_key(page_title)
+    try:
+        entry = reader.pop(cache_key)
+    except Exception as e:
+        logger.error(f"Failed to read cache snapshot entry {cache_key}: {e}")
+        return None
+    if entry is None:
+        return None
+
+    payload, timestamp, revid = entry
+    sections = tuple((heading, section_html) for heading, section_html in payload['sections'])
+    set_cached_sections(cache_key, sections)
+    if payload.get('links') is not None:
+        set_cached_links(cache_key, OutlinkIndex(payload['links']))
+    if revid:
+        page_revisions[cache_key] = revid
+
+    if time.time() - timestamp >= CACHE_EXPIRY:
+        schedule_revalidation(cache_key)
+    logger.debug(f"Restored page from snapshot: {cache_key}")
+    return sections
+
+def schedule_revalidation(cache_key):
+    """スナップショットから復元した古い記事の再検証を予約する"""
+    global revalidation_thread
+    with revalidation_lock:
+        if cache_key in revalidation_pending:
+            return
+        if revalidation_thread is None:
+            revalidation_thread = threading.Thread(target=run_revalidation, daemon=True)
+            revalidation_thread.start()
+        try:
+            revalidation_queue.put_nowait(cache_key)
+        except queue.Full:
+            return
+        revalidation_pending.add(cache_key)
+
+def run_revalidation():
+    """再検証キューを処理するバックグラウンドスレッド（最大50件ずつ版IDを確認）"""
+    while True:
+        titles = [revalidation_queue.get()]
+        while len(titles) < 50:
+            try:
+                titles.append(revalidation_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            revalidate_pages(titles)
+        except Exception as e:
+            logger.warning(f"Revalidation failed for {len(titles)} pages: {e}")
+        finally:
+            with revalidation_lock:
+                revalidation_pending.difference_update(titles)
+
+def revalidate_pages(titles):
+    """
+    版IDを一括で確認し、変わっていない記事はそのまま延命、変わった記事は取得し直す
+    """
+    data = wiki_get({
+        'action': 'query',
+        'prop': 'revisions',
+        'rvprop': 'ids',
+        'titles': '|'.join(titles),
+        'format': 'json',
+        'formatversion': 2
+    })
+    current = {}
+    for page in data.get('query', {}).get('pages', []):
+        if page.get('revisions'):
+            current[normalize_title(page['title'])] = page['revisions'][0]['revid']
+
+    for title in titles:
+        cached = section_cache.get(title)
+        if cached and current.get(title) and current[title] == page_revisions.get(title):
+            # 版が変わっていなければ、保存済みの加工結果をそのまま使い続ける
+            set_cached_sections(title, cached[0])
+            links = links_cache.get(title)
+            if links:
+                set_cached_links(title, links[0])
             continue
 
-        # 除外プレフィックスのチェック
-        if any(link.startswith(prefix) for prefix in EXCLUDED_PREFIXES):
+        page_data = wiki_get(build_parse_params(title))
+        record_title_aliases(title, page_data)
+        if 'parse' in page_data:
+            set_cached_page(title, page_data)
+            store_article(title, page_data)
+            logger.debug(f"Revalidated page from upstream: {title}")
+
+def write_cache_snapshot():
+    """現在のキャッシュをスナップショットとして書き出す（変更がなければ何もしない）"""
+    global snapshot_generation, snapshot_last_written
+    if not CACHE_SNAPSHOT_PATH or snapshot_generation == cache_generation:
+        return
+    from cache_snapshot import encode_entry, worker_snapshot_path, write_snapshot
+
+    generation = cache_generation
+    now = time.time()
+    entries = []
+    for title, (sections, timestamp) in list(section_cache.items()):
+        if now - timestamp >= CACHE_SNAPSHOT_MAX_AGE:
             continue
+        links = links_cache.get(title)
+        payload = {'sections': sections, 'links': links[0].titles if links else None}
+        entries.append((title, timestamp, page_revisions.get(title), encode_entry(payload)))
+
+    # まだ使われていない前回のスナップショットのエントリーも引き継ぐ
+    reader = get_snapshot_reader()
+    if reader is not None:
+        saved = {entry[0] for entry in entries}
+        for title, timestamp, revid, data in reader.remaining():
+            if title not in saved and now - timestamp < CACHE_SNAPSHOT_MAX_AGE:
+                entries.append((title, timestamp, revid, data))
+
+    with title_alias_lock:
+        aliases = dict(title_aliases)
+    # ワーカーごとに別のファイルに書き、互いに上書きしない
+    path = worker_snapshot_path(CACHE_SNAPSHOT_PATH)
+    try:
+        count = write_snapshot(path, entries, aliases)
+        snapshot_generation = generation
+        snapshot_last_written = time.time()
+        logger.info(f"Cache snapshot written: {count} entries to {path}")
+        # 読み込んだ以前のファイルは内容を引き継いだので削除する
+        if reader is not None:
+            reader.remove_superseded(path)
+    except Exception as e:
+        logger.error(f"Failed to write cache snapshot: {e}")
 
-        title = link.replace('/wiki/', '')
-        title = unquote(title).strip()
+def run_snapshot_writer():
+    """一定間隔でキャッシュスナップショットを書き出すバックグラウンドスレッド"""
+    while True:
+        time.sleep(CACHE_SNAPSHOT_INTERVAL)
+        write_cache_snapshot()
 
-        # 現在のページへのリンクはスキップ
-        if title == page_title:
-            continue
+def is_chunked(sections):
+    """記事をセクション単位で遅延配信するかどうか"""
+    if not app.config.get('ENABLE_CHUNKED_ARTICLES', True) or len(sections) < 2:
+        return False
+    return sum(len(section_html) for _, section_html in sections) >= app.config['CHUNK_MIN_BYTES']
 
-        new_clicks = clicks_remaining - 1
-        
-        # URLを生成してキャッシュ用データに保存
-        if title == target_title:
-            new_url = url_for('game', page=title, clicks=new_clicks,
-                            mytarget=target_title, difficulty=difficulty,
-                            start_time=start_time)
-        elif new_clicks <= 0:
-            new_url = url_for('game_over')
-        else:
-            new_url = url_for('game', page=title, clicks=new_clicks,
-                            mytarget=target_title, difficulty=difficulty,
-                            start_time=start_time)
-        
-        links_data[title] = new_url
-        links.append({
-            'title': title,
-            'href': link,
-            'clicks': new_clicks
-        })
-    
-    # リンク情報をキャッシュに保存
-    set_cached_links(page_title, links_data)
-    
-    return links[:50]  # 最初の50個のリンクのみ返す
+def render_section_outline(sections):
+    """リード部以降のセクションを、見出しだけのプレースホルダーとして出力する"""
+    return ''.join(
+        f'<section class="lazy-section" data-section="{index}"><h2>{html.escape(heading)}</h2></section>'
+        for index, (heading, _) in enumerate(sections) if index > 0
+    )
 
 # ハードモード用のカテゴリ別ページリスト
 HARD_MODE_CATEGORIES = {
@@ -477,10 +1313,7 @@ def get_random_page():
         'format': 'json'
     }
     try:
-        response = session.get(WIKI_API_URL, params=params, timeout=5)
-        if response.status_code != 200:
-            raise Exception(f"Status code: {response.status_code}")
-        data = response.json()
+        data = wiki_get(params)
         return data['query']['random'][0]['title']
     except Exception as e:
         app.logger.error(f"get_random_page Error: {e}")
@@ -501,6 +1334,107 @@ def get_hard_mode_target():
     # ランダムに選択
     return random.choice(all_pages)
 
+def build_game_html(page_title, target_title, clicks_remaining, difficulty, start_time):
+    """ゲーム画面に埋め込む記事本文（リンク書き換え済み）を生成する"""
+    try:
+        # 最適化・セクション分割済みの記事を取得
+        sections = get_article_sections(page_title)
+
+        # 長い記事はリード部と見出し一覧だけを返し、残りはスクロールに応じて/game_sectionから取得
+        if is_chunked(sections):
+            lead_html = process_links_in_html(sections[0][1], page_title, target_title,
+                                              clicks_remaining, difficulty, start_time)
+            return lead_html + render_section_outline(sections)
+
+        # リンク書き換え（キャッシュ機能付き）
+        parsed_html = ''.join(section_html for _, section_html in sections)
+        return process_links_in_html(parsed_html, page_title, target_title,
+                                     clicks_remaining, difficulty, start_time)
+
+    except OverloadedError as e:
+        # ストリーミング中はステータスを変えられないため、混雑を知らせる本文を返す
+        logger.warning(f"GameView shed for {page_title}: {e}")
+        return f'<div id="mw-content-text"><p>{BUSY_MESSAGE}</p></div>'
+    except KeyError as e:
+        logger.error(f"GameView KeyError: {e}")
+        log_security_event("WIKI_API_ERROR", f"KeyError in GameView: {e}")
+    except Exception as e:
+        logger.error(f"GameView Exception: {e}")
+        log_security_event("GAME_VIEW_ERROR", f"Exception in GameView: {e}")
+    return '<div id="mw-content-text"><p>エラーが発生しました。しばらく時間をおいてから再度お試しください。</p></div>'
+
+# 静的ファイルのフィンガープリント（内容のハッシュ付きURLで配信し、1年間immutableでキャッシュさせる）
+ENABLE_ASSET_FINGERPRINTING = app.config['ENABLE_ASSET_FINGERPRINTING']
+STATIC_BUILD_DIR = app.config['STATIC_BUILD_DIR'] or os.path.join(app.root_path, 'static_build')
+ASSET_MAX_AGE = 31536000  # 1年
+asset_manifest = None  # 元のファイル名 -> {'path': フィンガープリント付きのファイル名, 'encodings': [...]}
+asset_files = {}       # フィンガープリント付きのファイル名 -> 元のファイル名
+asset_lock = threading.Lock()
+
+def get_asset_manifest():
+    """静的ファイルのマニフェストを返す（初回呼び出し時にビルドする。ビルド済みのファイルは書き直さない）"""
+    global asset_manifest, asset_files
+    if asset_manifest is None:
+        with asset_lock:
+            if asset_manifest is None:
+                manifest = {}
+                if ENABLE_ASSET_FINGERPRINTING:
+                    try:
+                        from static_assets import build_assets
+
+                        manifest = build_assets(app.static_folder, STATIC_BUILD_DIR)
+                        logger.info(f"Static assets fingerprinted: {len(manifest)} files in {STATIC_BUILD_DIR}")
+                    except Exception as e:
+                        # 書き込めない環境などでは通常の/static/のURLで配信する
+                        logger.error(f"Failed to build static assets: {e}")
+                asset_files = {entry['path']: filename for filename, entry in manifest.items()}
+                asset_manifest = manifest
+    return asset_manifest
+
+def asset_url(filename):
+    """静的ファイルのURL（フィンガープリント付き。マニフェストになければ通常の/static/のURL）"""
+    entry = get_asset_manifest().get(filename)
+    if entry:
+        return url_for('assets', filename=entry['path'])
+    return url_for('static', filename=filename)
+
+# テンプレートでは url_for('static', ...) の代わりに asset_url(...) を使う
+app.jinja_env.globals['asset_url'] = asset_url
+
+# ストリーミング時に記事本文の位置を示すプレースホルダー
+ARTICLE_PLACEHOLDER = '<!--sixhop-article-->'
+
+# ストリーミング応答で先読みさせる静的ファイル
+STREAM_PRELOAD_ASSETS = [
+    ('css/styles.css', 'style'),
+    ('js/scripts.js', 'script'),
+    ('js/confetti.browser.min.js', 'script'),
+]
+
+def stream_game_page(build_html, **context):
+    """
+    game.htmlをストリーミングで返す
+    - 記事本文以外（head、CSS/JS参照、目標ページ、残りクリック数）を即座に送信
+    - 記事本文はbuild_html()の完了後にフラッシュする
+    """
+    # 骨組みのレンダリングは軽量なので先に済ませ、プレースホルダーで前後に分割
+    shell = render_template('game.html', parsed_html=Markup(ARTICLE_PLACEHOLDER), **context)
+    head, tail = shell.split(ARTICLE_PLACEHOLDER, 1)
+
+    def generate():
+        yield head
+        yield build_html()
+        yield tail
+
+    response = Response(stream_with_context(generate()), mimetype='text/html')
+    response.headers['Link'] = ', '.join(
+        f'<{asset_url(filename)}>; rel=preload; as={kind}'
+        for filename, kind in STREAM_PRELOAD_ASSETS
+    )
+    # リバースプロキシ（nginx等）によるバッファリングを無効化
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 
 class OpeningView(MethodView):
     def get(self):
@@ -542,9 +1476,8 @@ class StartGameView(MethodView):
                     all_pages.extend(pages)
                 start_page = random.choice([p for p in all_pages if p != target_title])
 
-        # ゲーム開始時刻を記録
-        import time
-        start_time = int(time.time() * 1000)  # ミリ秒で記録
+        # ゲーム開始時刻を記録（クリア時に改ざんされていないか確認できるよう署名を付ける）
+        start_time = issue_start_time()
 
         return redirect(url_for('game', page=start_page, clicks=INITIAL_CLICKS,
                                 mytarget=target_title, difficulty=difficulty, 
@@ -586,9 +1519,8 @@ class ResetView(MethodView):
 
         app.logger.debug(f"ResetView: start='{start_page}', target='{target_title}'")
 
-        # ゲーム開始時刻を記録
-        import time
-        start_time = int(time.time() * 1000)  # ミリ秒で記録
+        # ゲーム開始時刻を記録（クリア時に改ざんされていないか確認できるよう署名を付ける）
+        start_time = issue_start_time()
 
         # クリック数をリセットして、/game に飛ばす
         return redirect(url_for('game', page=start_page, clicks=INITIAL_CLICKS,
@@ -601,8 +1533,8 @@ class GameView(MethodView):
         # difficultyに応じたターゲット切り替えのため、difficultyも受け取る
         difficulty = request.args.get('difficulty', 'easy')
         # デフォルトはネコ
-        target_title = sanitize_input(request.args.get('mytarget', TARGET_TITLE))
-        page_title = sanitize_input(request.args.get('page', 'ネコ'))  # デフォルトは「ネコ」
+        target_title = normalize_title(sanitize_input(request.args.get('mytarget', TARGET_TITLE)))
+        page_title = normalize_title(sanitize_input(request.args.get('page', 'ネコ')))  # デフォルトは「ネコ」
         clicks_remaining = request.args.get('clicks', str(INITIAL_CLICKS))
         start_time = request.args.get('start_time', '0')
         
@@ -624,6 +1556,20 @@ class GameView(MethodView):
         except ValueError:
             clicks_remaining = INITIAL_CLICKS
 
+        # 遷移検証: 要求されたページが遷移元ページから実際にリンクされているか
+        prev_title = normalize_title(sanitize_input(request.args.get('prev', '')))
+        linked = None
+        if prev_title:
+            linked = is_linked_from(prev_title, page_title)
+            if linked is False:
+                log_security_event("INVALID_HOP", f"Page {page_title} is not linked from {prev_title}")
+                return redirect(url_for('opening', error='無効なページ遷移です'))
+            if linked is None:
+                logger.debug(f"GameView: hop {prev_title} -> {page_title} could not be verified (not cached)")
+        elif clicks_remaining < INITIAL_CLICKS:
+            log_security_event("MISSING_PREV_PAGE", f"No prev page for {page_title} with clicks={clicks_remaining}")
+            return redirect(url_for('opening', error='無効なページ遷移です'))
+
         app.logger.debug(
             f"GameView: page_title = '{page_title}', target_title = '{target_title}', clicks_remaining = {clicks_remaining}, difficulty={difficulty}")
 
@@ -633,75 +1579,74 @@ class GameView(MethodView):
             # スコアデータを計算
             used_clicks = INITIAL_CLICKS - clicks_remaining
             
-            # 正確な時間計算
-            import time
-            try:
-                start_time_ms = int(start_time)
-                current_time_ms = int(time.time() * 1000)
-                elapsed_time = current_time_ms - start_time_ms
-            except (ValueError, TypeError):
+            # 正確な時間計算（開始時刻はサーバーが署名したものだけを使う）
+            start_time_ms = verify_start_time(start_time)
+            if start_time_ms is not None:
+                elapsed_time = int(time.time() * 1000) - start_time_ms
+            else:
                 # フォールバック: クリック数から推定
                 elapsed_time = used_clicks * 2000
             
+            # 経路（クライアントが記録した、目標ページの直前までに訪れたページ）はクリック数と辻褄が合う場合だけ使う
+            path = parse_score_path(request.args.get('path', ''), used_clicks, prev_title)
+
+            # 集計用に結果へ署名を付ける（署名付きの開始時刻から1クリック以上で、最後の遷移を検証できた場合だけ）
+            signature = ''
+            if start_time_ms is not None and used_clicks >= 1 and prev_title:
+                if linked is None:
+                    # 遷移元がキャッシュになければ取得して検証する（取得できなければ集計しない）
+                    try:
+                        linked = page_title in get_page_links(prev_title)
+                    except Exception as e:
+                        logger.warning(f"GameView: could not verify final hop {prev_title} -> {page_title}: {e}")
+                if linked is True:
+                    signature = sign_score(target_title, used_clicks, elapsed_time, difficulty, start_time, path)
+                else:
+                    log_security_event("UNVERIFIED_CLEAR", f"Clear of {target_title} from {prev_title} not recorded")
+
             # URLパラメータとしてリダイレクト
             app.logger.debug(f"GameView: Redirecting to game_clear with clicks={used_clicks}, time={elapsed_time}, target={target_title}")
             return redirect(url_for('game_clear', 
                                   clicks=used_clicks, 
                                   time=elapsed_time, 
-                                  target=target_title))
+                                  target=target_title,
+                                  difficulty=difficulty,
+                                  start=start_time,
+                                  path='|'.join(path),
+                                  sig=signature))
 
         # ゲームオーバー判定
         if clicks_remaining <= 0:
             app.logger.debug("GameView: Game Over")
             return redirect(url_for('game_over'))
 
-        try:
-            # キャッシュからページデータを取得
-            cached_data = get_cached_page(page_title)
-            if cached_data:
-                logger.debug(f"Using cached data for page: {page_title}")
-                data = cached_data
-            else:
-                # ページ内容の取得（最適化版）
-                params = {
-                    'action': 'parse',
-                    'page': page_title,
-                    'format': 'json',
-                    'prop': 'text',
-                    'redirects': 1,
-                    'disableeditsection': 1,  # 編集セクションを無効化してレスポンスを軽量化
-                    'disabletoc': 1,  # 目次を無効化
-                    'disablelimitreport': 1,  # 制限レポートを無効化
-                    'disablepp': 1  # 前処理を無効化
-                }
-                
-                # セッションを使用してタイムアウトを短縮（さらに短縮）
-                response = session.get(WIKI_API_URL, params=params, timeout=2)
-                data = response.json()
-                
-                # データをキャッシュに保存
-                set_cached_page(page_title, data)
-
-            if 'parse' not in data:
-                raise KeyError("'parse' キーがレスポンスに存在しません。")
-
-            parsed_html = data['parse']['text']['*']
-            
-            # HTMLコンテンツの最適化（不要な要素を削除）
-            parsed_html = optimize_html_content(parsed_html)
-
-            # リンク書き換え（キャッシュ機能付き）
-            parsed_html = process_links_in_html(parsed_html, page_title, target_title, 
-                                              clicks_remaining, difficulty, start_time)
-
-        except KeyError as e:
-            logger.error(f"GameView KeyError: {e}")
-            log_security_event("WIKI_API_ERROR", f"KeyError in GameView: {e}")
-            parsed_html = f'<div id="mw-content-text"><p>エラーが発生しました。しばらく時間をおいてから再度お試しください。</p></div>'
-        except Exception as e:
-            logger.error(f"GameView Exception: {e}")
-            log_security_event("GAME_VIEW_ERROR", f"Exception in GameView: {e}")
-            parsed_html = f'<div id="mw-content-text"><p>エラーが発生しました。しばらく時間をおいてから再度お試しください。</p></div>'
+        # 混雑時は、上流の取得が必要なページだけを受付の時点で断る（キャッシュ済みのページは通常どおり返す）
+        if not is_page_available(page_title) and admission_gate.should_shed():
+            logger.warning(f"GameView shed on arrival: {page_title}")
+            response = make_response(render_template(
+                'game.html',
+                target_title=target_title,
+                page_title=page_title,
+                clicks_remaining=clicks_remaining,
+                parsed_html=Markup(f'<div id="mw-content-text"><p>{BUSY_MESSAGE}</p></div>'),
+                difficulty=difficulty
+            ), 503)
+            response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER)
+            return response
+
+        # ストリーミング配信: ページの骨組みを先に返し、記事本文は準備でき次第送る
+        if app.config.get('ENABLE_STREAMING_RENDER', True):
+            return stream_game_page(
+                lambda: build_game_html(page_title, target_title, clicks_remaining,
+                                        difficulty, start_time),
+                target_title=target_title,
+                page_title=page_title,
+                clicks_remaining=clicks_remaining,
+                difficulty=difficulty
+            )
+
+        parsed_html = build_game_html(page_title, target_title, clicks_remaining,
+                                      difficulty, start_time)
 
         return render_template(
             'game.html',
@@ -722,11 +1667,31 @@ class GameClearView(MethodView):
         # デバッグ用ログ
         app.logger.debug(f"GameClearView: clicks={clicks}, time={time_ms}, target={target}")
         app.logger.debug(f"GameClearView: request.args = {dict(request.args)}")
+
+        # 署名が正しい結果だけを集計に送る（バッファに追加するだけで、書き込みはバックグラウンド）
+        record_score(request.args)
         
         return render_template('game_clear.html', 
                              clicks=clicks, 
                              time_ms=time_ms, 
-                             target=target)
+                             target=target,
+                             stats=score_store.summary(normalize_title(target)) if score_store else None)
+
+class StatsView(MethodView):
+    @limiter.limit("60 per minute")
+    def get(self):
+        """
+        目標ページごとのクリア統計（メモリ上の集計をそのまま返す）
+        """
+        target_title = normalize_title(sanitize_input(request.args.get('target', '')))
+        if not validate_page_title(target_title):
+            log_security_event("INVALID_TARGET_TITLE_API", f"Invalid target title: {target_title}")
+            return jsonify({'status': 'error', 'message': '無効なターゲットタイトルです'})
+
+        summary = score_store.summary(target_title) if score_store else None
+        if summary is None:
+            return jsonify({'status': 'empty', 'target': target_title})
+        return jsonify({'status': 'success', 'target': target_title, **summary})
 
 class GameOverView(MethodView):
     def get(self):
@@ -740,8 +1705,8 @@ class GameDataView(MethodView):
         """
         # パラメータの取得
         difficulty = request.args.get('difficulty', 'easy')
-        target_title = sanitize_input(request.args.get('mytarget', TARGET_TITLE))
-        page_title = sanitize_input(request.args.get('page', 'ネコ'))
+        target_title = normalize_title(sanitize_input(request.args.get('mytarget', TARGET_TITLE)))
+        page_title = normalize_title(sanitize_input(request.args.get('page', 'ネコ')))
         clicks_remaining = request.args.get('clicks', str(INITIAL_CLICKS))
         start_time = request.args.get('start_time', '0')
         
@@ -775,85 +1740,291 @@ class GameDataView(MethodView):
         if clicks_remaining <= 0:
             return jsonify({'status': 'over'})
 
-        try:
-            # キャッシュからページデータを取得
-            cached_data = get_cached_page(page_title)
-            if cached_data:
-                data = cached_data
-            else:
-                # ページ内容の取得（軽量版）
-                params = {
-                    'action': 'parse',
-                    'page': page_title,
-                    'format': 'json',
-                    'prop': 'text',
-                    'redirects': 1,
-                    'disableeditsection': 1,
-                    'disabletoc': 1,
-                    'disablelimitreport': 1,
-                    'disablepp': 1
-                }
-                
-                response = session.get(WIKI_API_URL, params=params, timeout=2)
-                data = response.json()
-                
-                # データをキャッシュに保存
-                set_cached_page(page_title, data)
-
-            if 'parse' not in data:
-                raise KeyError("'parse' キーがレスポンスに存在しません。")
-
-            parsed_html = data['parse']['text']['*']
-            
-            # HTMLコンテンツの最適化（不要な要素を削除）
-            parsed_html = optimize_html_content(parsed_html)
-
-            # リンク書き換え（キャッシュ機能付き軽量版）
-            links = process_links_for_api(parsed_html, page_title, target_title, 
-                                        clicks_remaining, difficulty, start_time)
+        if not is_page_available(page_title) and admission_gate.should_shed():
+            return busy_json_response()
 
+        try:
+            # 発リンク先インデックスがキャッシュにあれば、ページ本文の取得・解析は不要
+            outlinks = get_cached_links(page_title)
+            if outlinks is None:
+                # 記事の取得・最適化と発リンク先インデックスの作成
+                sections = get_article_sections(page_title)
+                outlinks = get_outlink_index(''.join(section_html for _, section_html in sections), page_title)
+
+            # リンク一覧はインデックスが保持する不変タプルをそのまま返す
             return jsonify({
                 'status': 'success',
                 'page_title': page_title,
                 'target_title': target_title,
                 'clicks_remaining': clicks_remaining,
-                'links': links
+                'next_clicks': clicks_remaining - 1,
+                'links': outlinks.titles
             })
 
+        except OverloadedError:
+            return busy_json_response()
         except Exception as e:
             logger.error(f"GameDataView Exception: {e}")
             log_security_event("GAME_DATA_ERROR", f"Exception in GameDataView: {e}")
             return jsonify({'status': 'error', 'message': 'エラーが発生しました。しばらく時間をおいてから再度お試しください。'})
 
-# Keep-alive機能
-def keep_alive():
-    """サーバーを常時稼働させるためのKeep-alive機能"""
-    try:
-        # 自分自身にリクエストを送信
-        base_url = os.environ.get('BASE_URL', 'http://localhost:5000')
-        response = requests.get(f"{base_url}/health", timeout=10)
-        if response.status_code == 200:
-            logger.info("Keep-alive ping successful")
+def page_links_etag(page_title, outlinks):
+    """ページの版IDから強いETagを作る（版IDがなければリンク一覧のハッシュ）"""
+    revid = page_revisions.get(get_cache_key(page_title))
+    if revid:
+        return f'v{PAGE_LINKS_VERSION}-{revid}'
+    import hashlib
+
+    digest = hashlib.sha1('\n'.join(outlinks.titles).encode('utf-8')).hexdigest()[:16]
+    return f'v{PAGE_LINKS_VERSION}-h{digest}'
+
+def get_page_links(page_title):
+    """ページの発リンク先インデックスを取得（なければ記事を取得・加工して作る。別名マップもここで記録される）"""
+    outlinks = get_cached_links(page_title)
+    if outlinks is None:
+        sections = get_article_sections(page_title)
+        outlinks = get_outlink_index(''.join(section_html for _, section_html in sections), page_title)
+    return outlinks
+
+def page_links_payload(requested_title, outlinks):
+    """/page_links と一括取得で共通のペイロード"""
+    canonical_title = resolve_title(requested_title)
+    return {
+        'status': 'success',
+        'requested': requested_title,
+        'page_title': canonical_title,
+        'revid': page_revisions.get(canonical_title),
+        'links': outlinks.titles
+    }
+
+class PageLinksView(MethodView):
+    @limiter.limit("120 per minute")
+    def get(self):
+        """
+        ページ単位のリンク一覧（プレイヤーの状態に依存しないため共有キャッシュ可能）
+        - 正規タイトル以外で要求された場合は正規タイトルのURLへリダイレクトする
+        - 版IDから作ったETagで If-None-Match に304を返す
+        """
+        page_title = normalize_title(sanitize_input(request.args.get('page', '')))
+
+        if not validate_page_title(page_title):
+            log_security_event("INVALID_PAGE_TITLE_API", f"Invalid page title: {page_title}")
+            return jsonify({'status': 'error', 'message': '無効なページタイトルです'})
+
+        if not is_page_available(page_title) and admission_gate.should_shed():
+            return busy_json_response()
+
+        try:
+            outlinks = get_page_links(page_title)
+
+            # キャッシュのキーを1つにまとめるため、正規タイトルのURLに寄せる
+            canonical_title = resolve_title(page_title)
+            if canonical_title != page_title:
+                return redirect(url_for('page_links', page=canonical_title))
+
+            response = jsonify(page_links_payload(canonical_title, outlinks))
+            response.set_etag(page_links_etag(canonical_title, outlinks))
+            return response.make_conditional(request)
+
+        except OverloadedError:
+            return busy_json_response()
+        except Exception as e:
+            logger.error(f"PageLinksView Exception: {e}")
+            log_security_event("PAGE_LINKS_ERROR", f"Exception in PageLinksView: {e}")
+            return jsonify({'status': 'error', 'message': 'エラーが発生しました。しばらく時間をおいてから再度お試しください。'})
+
+class PageLinksBatchView(MethodView):
+    # レート制限は一括リクエスト1回につき1回だけ数える
+    @limiter.limit("30 per minute")
+    def get(self):
+        """
+        複数ページのリンク一覧を1往復で取得するエンドポイント（NDJSONでストリーミング）
+        - キャッシュ済みのページを先に返し、未取得のページは同時実行数を制限して並行に取得する
+        - 取得できたものから1行ずつ返す
+        - 無効なタイトルはそのタイトルだけエラーの行を返し、残りはそのまま取得する
+        """
+        titles = []
+        invalid = []
+        for raw_title in request.args.getlist('page'):
+            page_title = normalize_title(sanitize_input(raw_title))
+            if not validate_page_title(page_title):
+                log_security_event("INVALID_PAGE_TITLE_API", f"Invalid page title: {page_title}")
+                # クライアントが要求したURLと対応付けられるよう、送られてきたままのタイトルで返す
+                if raw_title not in invalid:
+                    invalid.append(raw_title)
+            elif page_title not in titles:
+                titles.append(page_title)
+
+        count = len(titles) + len(invalid)
+        if not count or count > PAGE_LINKS_BATCH_MAX:
+            log_security_event("INVALID_BATCH_SIZE", f"Invalid batch size: {count}")
+            return jsonify({'status': 'error', 'message': f'ページ数は1〜{PAGE_LINKS_BATCH_MAX}件で指定してください'})
+
+        return Response(stream_with_context(stream_page_links(titles, invalid)), mimetype='application/x-ndjson')
+
+def stream_page_links(titles, invalid=()):
+    """一括取得の結果をNDJSONの行として順に返すジェネレーター（invalidは無効なタイトル）"""
+    import json
+
+    def line(payload):
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    def error_payload(page_title, e):
+        if isinstance(e, OverloadedError):
+            return {'status': 'busy', 'requested': page_title, 'message': BUSY_MESSAGE}
+        logger.error(f"PageLinksBatch Exception for {page_title}: {e}")
+        return {'status': 'error', 'requested': page_title, 'message': 'エラーが発生しました。'}
+
+    for raw_title in invalid:
+        yield line({'status': 'error', 'requested': raw_title, 'message': '無効なページタイトルです'})
+
+    # キャッシュ済みのページは上流を待たずにすぐ返す
+    misses = []
+    for page_title in titles:
+        outlinks = get_cached_links(page_title)
+        if outlinks is None:
+            misses.append(page_title)
         else:
-            logger.warning(f"Keep-alive ping failed with status: {response.status_code}")
-    except Exception as e:
-        logger.error(f"Keep-alive ping error: {e}")
+            yield line(page_links_payload(page_title, outlinks))
 
-def run_scheduler():
-    """スケジューラーを実行する関数"""
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # 1分ごとにチェック
+    if not misses:
+        return
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    executor = ThreadPoolExecutor(max_workers=min(PAGE_LINKS_BATCH_CONCURRENCY, len(misses)))
+    try:
+        futures = {executor.submit(get_page_links, page_title): page_title for page_title in misses}
+        for future in as_completed(futures):
+            page_title = futures[future]
+            try:
+                payload = page_links_payload(page_title, future.result())
+            except Exception as e:
+                payload = error_payload(page_title, e)
+            yield line(payload)
+    finally:
+        # クライアントが途中で切断した場合、まだ始まっていない取得は取り消す
+        executor.shutdown(wait=False, cancel_futures=True)
+
+class AssetView(MethodView):
+    def get(self, filename):
+        """
+        フィンガープリント付きの静的ファイル
+        - ブラウザが対応していれば事前圧縮版（br → gzip の順）を返す
+        - 古いハッシュのURLは現在のURLへリダイレクトする
+        """
+        manifest = get_asset_manifest()
+        source = asset_files.get(filename)
+        if source is None:
+            root, ext = os.path.splitext(filename)
+            current = os.path.splitext(root)[0] + ext
+            if current in manifest:
+                return redirect(asset_url(current))
+            abort(404)
+
+        import mimetypes
+
+        encoding = next((enc for enc in ('br', 'gzip')
+                         if enc in manifest[source]['encodings'] and enc in request.accept_encodings), None)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+        response = send_from_directory(STATIC_BUILD_DIR, filename + suffix,
+                                       mimetype=mimetypes.guess_type(source)[0] or 'application/octet-stream')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if manifest[source]['encodings']:
+            response.vary.add('Accept-Encoding')
+        return response
+
+# sw.js内の静的ファイルのURL（'/static/...'）
+SW_STATIC_URL_PATTERN = re.compile(r"'/static/([^']+)'")
+
+class ServiceWorkerView(MethodView):
+    def get(self):
+        """
+        Service Workerのスクリプト（サイト全体をスコープにするためルートから配信する）
+        STATIC_ASSETS の /static/ のURLはフィンガープリント付きのURLに置き換える
+        （静的ファイルが変わるとsw.jsの内容も変わり、Service Workerが更新される）
+        """
+        with open(os.path.join(app.root_path, 'sw.js'), encoding='utf-8') as f:
+            script = SW_STATIC_URL_PATTERN.sub(lambda m: f"'{asset_url(m.group(1))}'", f.read())
+        response = Response(script, mimetype='application/javascript')
+        response.cache_control.no_cache = True
+        response.add_etag()
+        return response.make_conditional(request)
+
+class GameSectionView(MethodView):
+    @limiter.limit("120 per minute")
+    def get(self):
+        """
+        セクション単位の遅延配信用エンドポイント（スクロールに応じて取得）
+        """
+        # パラメータの取得
+        difficulty = request.args.get('difficulty', 'easy')
+        target_title = normalize_title(sanitize_input(request.args.get('mytarget', TARGET_TITLE)))
+        page_title = normalize_title(sanitize_input(request.args.get('page', 'ネコ')))
+        clicks_remaining = request.args.get('clicks', str(INITIAL_CLICKS))
+        start_time = request.args.get('start_time', '0')
+        section_index = request.args.get('section', '')
+
+        # 入力検証
+        if difficulty not in ['easy', 'hard']:
+            log_security_event("INVALID_DIFFICULTY_API", f"Invalid difficulty: {difficulty}")
+            return jsonify({'status': 'error', 'message': '無効な難易度です'})
+
+        if not validate_page_title(page_title):
+            log_security_event("INVALID_PAGE_TITLE_API", f"Invalid page title: {page_title}")
+            return jsonify({'status': 'error', 'message': '無効なページタイトルです'})
+
+        if not validate_page_title(target_title):
+            log_security_event("INVALID_TARGET_TITLE_API", f"Invalid target title: {target_title}")
+            return jsonify({'status': 'error', 'message': '無効なターゲットタイトルです'})
+
+        try:
+            clicks_remaining = int(clicks_remaining)
+            section_index = int(section_index)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': '無効なセクションです'})
+
+        # ゲームオーバー判定
+        if clicks_remaining <= 0:
+            return jsonify({'status': 'over'})
+
+        try:
+            sections = get_article_sections(page_title)
+            if not 0 < section_index < len(sections):
+                return jsonify({'status': 'error', 'message': '無効なセクションです'})
+
+            # セクション単体でリンク書き換え（インデックスは記事全体から作成済み）
+            section_html = process_links_in_html(sections[section_index][1], page_title, target_title,
+                                                 clicks_remaining, difficulty, start_time, fragment=True)
+            return jsonify({
+                'status': 'success',
+                'section': section_index,
+                'html': section_html
+            })
+
+        except OverloadedError:
+            return busy_json_response()
+        except Exception as e:
+            logger.error(f"GameSectionView Exception: {e}")
+            log_security_event("GAME_SECTION_ERROR", f"Exception in GameSectionView: {e}")
+            return jsonify({'status': 'error', 'message': 'エラーが発生しました。しばらく時間をおいてから再度お試しください。'})
 
 # 本番環境でのみKeep-aliveを有効化
-if config_name == 'production':
-    # 15分ごとにKeep-aliveを実行
-    schedule.every(15).minutes.do(keep_alive)
-    
-    # スケジューラーを別スレッドで実行
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
-    logger.info("Keep-alive scheduler started")
+# gunicornではgunicorn.conf.pyのフックでマスタープロセスから1回だけ起動するため、ここでは起動しない
+if config_name == 'production' and os.environ.get('BACKGROUND_SERVICES', 'worker') == 'worker':
+    from background import start_background_services
+    start_background_services()
+
+# 期限切れキャッシュの定期的な掃除（ワーカーごとのキャッシュなのでワーカーごとに動かす）
+if CACHE_SWEEP_INTERVAL > 0:
+    threading.Thread(target=run_cache_sweeper, daemon=True).start()
+
+# キャッシュスナップショットの定期書き出し（ワーカーごとのキャッシュなのでワーカーごとに動かす）
+if CACHE_SNAPSHOT_PATH:
+    if CACHE_SNAPSHOT_INTERVAL > 0:
+        threading.Thread(target=run_snapshot_writer, daemon=True).start()
+    atexit.register(write_cache_snapshot)
 
 class HealthCheckView(MethodView):
     """ヘルスチェック用のエンドポイント"""
@@ -864,15 +2035,304 @@ class HealthCheckView(MethodView):
             'version': '1.0.0'
         })
 
+class MetricsView(MethodView):
+    """運用メトリクス（キャッシュ件数、上流の状態、流量制御、HTML加工プール、スナップショット）のエンドポイント（管理者用）"""
+    def get(self):
+        # ファイルパスや内部状態を含むため、メモリ調査と同じく管理用トークンを要求する
+        error = check_admin_token()
+        if error:
+            return error
+        with html_pool_lock:
+            pool_stats = dict(html_pool_stats)
+        pool_stats['pool_size'] = HTML_PROCESS_POOL_SIZE
+        pool_stats['active'] = html_pool is not None
+        return jsonify({
+            'caches': {
+                'page': len(page_cache),
+                'links': len(links_cache),
+                'sections': len(section_cache),
+                'negative': len(negative_cache),
+                'title_aliases': len(title_aliases),
+                'interned_titles': len(intern_table.names),
+                'interned_titles_max': TITLE_INTERN_MAX,
+                'intern_rebuilds': intern_stats['rebuilds'],
+                'intern_swept_links': intern_stats['swept_links'],
+                'limits': {'page': PAGE_CACHE_MAX, 'sections': SECTION_CACHE_MAX, 'negative': NEGATIVE_CACHE_MAX},
+                **cache_sweep_stats,
+            },
+            'upstream': {host: breaker.stats() for host, breaker in list(circuit_breakers.items())},
+            'admission': admission_gate.stats(),
+            'scores': score_store.stats() if score_store else None,
+            'html_pool': pool_stats,
+            'snapshot': {
+                'path': CACHE_SNAPSHOT_PATH,
+                'loaded_entries_remaining': len(snapshot_reader) if snapshot_reader is not None else None,
+                'last_written': snapshot_last_written,
+                'revalidation_pending': len(revalidation_pending),
+            },
+        })
+
+# クリア結果の集計の設定（SCORE_DATA_DIRが空なら無効）
+SCORE_DATA_DIR = app.config['SCORE_DATA_DIR']
+SCORE_MAX_TIME_MS = 24 * 60 * 60 * 1000  # これより長いクリア時間は集計しない
+score_store = None
+seen_score_signatures = OrderedDict()  # 同じ結果（クリア画面の再読み込みなど）を二重に数えないため
+seen_score_lock = threading.Lock()
+SEEN_SCORE_MAX = 10000
+
+def sign_message(message):
+    """SECRET_KEYによるHMAC（16進数32文字）"""
+    import hashlib
+    import hmac
+
+    return hmac.new(app.config['SECRET_KEY'].encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+def sign_score(target_title, clicks, time_ms, difficulty, start_time, path):
+    """クリア結果の署名（GameViewが付け、GameClearViewで確認する）"""
+    return sign_message('\n'.join([target_title, str(clicks), str(time_ms), difficulty, str(start_time), '|'.join(path)]))
+
+def issue_start_time():
+    """
+    署名付きのゲーム開始時刻（StartGameView・ResetViewが発行する）
+    形式は <ミリ秒>.<署名>。クライアントのタイマーは先頭の数字だけを読む
+    """
+    start_ms = int(time.time() * 1000)
+    signature = sign_message(f'start\n{start_ms}')
+    return f'{start_ms}.{signature}'
+
+def verify_start_time(start_time):
+    """署名付きのゲーム開始時刻を確認してミリ秒を返す（署名がない・合わない、未来の時刻ならNone）"""
+    import hmac
+
+    start_ms, _, signature = str(start_time).partition('.')
+    if not start_ms.isdigit() or not signature:
+        return None
+    expected = sign_message(f'start\n{start_ms}')
+    if not hmac.compare_digest(signature.encode('utf-8'), expected.encode('utf-8')):
+        return None
+    start_ms = int(start_ms)
+    return start_ms if start_ms <= time.time() * 1000 else None
+
+def parse_score_path(raw_path, used_clicks, prev_title):
+    """
+    クライアントが記録した経路を検証する
+    - 目標ページの直前までに訪れたページを | 区切りで受け取る
+    - 件数がクリック数と一致し、最後が遷移元ページの場合だけ使う（合わなければ空）
+    """
+    titles = [normalize_title(sanitize_input(title)) for title in raw_path.split('|')] if raw_path else []
+    if len(titles) != used_clicks or not all(validate_page_title(title) for title in titles):
+        return []
+    if titles and titles[-1] != prev_title:
+        return []
+    return titles
+
+def record_score(args):
+    """署名を確認してクリア結果を集計のバッファに追加する"""
+    if score_store is None:
+        return False
+    target_title = args.get('target', '')
+    difficulty = args.get('difficulty', 'easy')
+    start_time = args.get('start', '0')
+    path = [title for title in args.get('path', '').split('|') if title]
+    try:
+        clicks = int(args.get('clicks', ''))
+        time_ms = int(args.get('time', ''))
+    except ValueError:
+        return False
+
+    import hmac
+
+    signature = args.get('sig', '')
+    expected = sign_score(target_title, clicks, time_ms, difficulty, start_time, path)
+    if not hmac.compare_digest(signature.encode('utf-8'), expected.encode('utf-8')):
+        if signature:
+            log_security_event("INVALID_SCORE_SIGNATURE", f"Invalid score signature for {target_title}")
+        return False
+    # 目標ページから始めた（0クリック）結果は数えない
+    if not 1 <= clicks <= INITIAL_CLICKS or not 0 <= time_ms <= SCORE_MAX_TIME_MS:
+        return False
+
+    with seen_score_lock:
+        if signature in seen_score_signatures:
+            return False
+        seen_score_signatures[signature] = True
+        while len(seen_score_signatures) > SEEN_SCORE_MAX:
+            seen_score_signatures.popitem(last=False)
+
+    return score_store.record({
+        'target': target_title,
+        'clicks': clicks,
+        'time_ms': time_ms,
+        'difficulty': difficulty,
+        'path': path + [target_title] if path else [],
+        'at': int(time.time()),
+    })
+
+# 管理用エンドポイントの設定（ADMIN_TOKENが空なら無効）
+ADMIN_TOKEN = app.config['ADMIN_TOKEN']
+MEMORY_REPORT_SAMPLE = app.config['MEMORY_REPORT_SAMPLE']
+allocation_tracker = None
+
+def check_admin_token():
+    """管理用トークンを確認する（問題なければNone、そうでなければエラー応答を返す）"""
+    if not ADMIN_TOKEN:
+        abort(404)
+    import hmac
+
+    token = request.headers.get('X-Admin-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        log_security_event("ADMIN_AUTH_FAILED", f"Invalid admin token for {request.path}")
+        response = jsonify({'status': 'error', 'message': '認証に失敗しました'})
+        response.status_code = 403
+        return response
+    return None
+
+def get_allocation_tracker():
+    """tracemallocの集計（初回使用時に作成）"""
+    global allocation_tracker
+    if allocation_tracker is None:
+        from memory_report import AllocationTracker
+
+        allocation_tracker = AllocationTracker()
+    return allocation_tracker
+
+class MemoryReportView(MethodView):
+    @limiter.limit("30 per minute")
+    def get(self):
+        """
+        キャッシュのメモリ使用量のレポート（管理者用）
+        - 層ごとの件数、推定サイズ（deep size）、大きいエントリー、経過時間の分布
+        - 件数がMEMORY_REPORT_SAMPLEを超える層は先頭から測定して推定する
+        """
+        error = check_admin_token()
+        if error:
+            return error
+        from memory_report import measure_tier, process_memory
+
+        try:
+            largest = min(max(int(request.args.get('largest', '10')), 1), 100)
+            sample = max(int(request.args.get('sample', str(MEMORY_REPORT_SAMPLE))), 1)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': '無効なパラメータです'})
+
+        # 他のスレッドが書き換えても壊れないように、各層の中身は先にコピーする
+        with title_alias_lock:
+            aliases = list(title_aliases.items())
+        with title_lock:
+            interned = list(intern_table.ids.items())
+        tiers = {
+            'page': [(key, value[0], value[1]) for key, value in list(page_cache.items())],
+            # インデックスが参照する共有のインターンテーブルはinterned_titlesで数える
+            'links': [(key, (value[0].ids, value[0].titles), value[1]) for key, value in list(links_cache.items())],
+            'sections': [(key, value[0], value[1]) for key, value in list(section_cache.items())],
+            'negative': [(key, value, value[2]) for key, value in list(negative_cache.items())],
+            'title_aliases': [(key, value, None) for key, value in aliases],
+            'interned_titles': [(key, value, None) for key, value in interned],
+            'page_revisions': [(key, value, None) for key, value in list(page_revisions.items())],
+        }
+        if snapshot_reader is not None:
+            tiers['snapshot_index'] = [(key, value, value[2]) for key, value in list(snapshot_reader.entries.items())]
+
+        started = time.perf_counter()
+        report = {name: measure_tier(entries, largest=largest, sample=sample if len(entries) > sample else None)
+                  for name, entries in tiers.items()}
+        return jsonify({
+            'status': 'success',
+            'process': process_memory(),
+            'tiers': report,
+            'total_deep_bytes': sum(tier['deep_bytes'] for tier in report.values()),
+            'elapsed': time.perf_counter() - started,
+        })
+
+class TracemallocView(MethodView):
+    @limiter.limit("30 per minute")
+    def post(self):
+        """
+        tracemallocによる確保場所ごとの集計（管理者用）
+        - action=start: 追跡を開始し基準のスナップショットを取る（frames: 記録するスタックの深さ）
+        - action=top: 現在の確保量の多い場所
+        - action=diff: 基準との差分（reset=1で現在を新しい基準にする）
+        - action=stop: 追跡を終了する（追跡中は確保のたびに負荷がかかるため、調査後は止める）
+        """
+        error = check_admin_token()
+        if error:
+            return error
+
+        action = request.values.get('action', '')
+        group_by = request.values.get('group_by', 'lineno')
+        if group_by not in ('lineno', 'filename', 'traceback'):
+            return jsonify({'status': 'error', 'message': '無効なgroup_byです'})
+        try:
+            limit = min(max(int(request.values.get('limit', '20')), 1), 200)
+            frames = min(max(int(request.values.get('frames', '1')), 1), 25)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': '無効なパラメータです'})
+
+        tracker = get_allocation_tracker()
+        if action == 'start':
+            tracker.start(frames)
+            logger.info(f"tracemalloc started (frames={frames})")
+            return jsonify({'status': 'success', 'tracing': True})
+        if action == 'stop':
+            tracker.stop()
+            logger.info("tracemalloc stopped")
+            return jsonify({'status': 'success', 'tracing': False})
+        if action not in ('top', 'diff'):
+            return jsonify({'status': 'error', 'message': '無効なactionです'})
+        if not tracker.is_tracing() or tracker.baseline is None:
+            return jsonify({'status': 'error', 'message': 'tracemallocが開始されていません（action=start）'})
+        if action == 'top':
+            return jsonify({'status': 'success', 'sites': tracker.top(limit, group_by)})
+        reset = request.values.get('reset', '0') == '1'
+        return jsonify({'status': 'success', **tracker.diff(limit, group_by, reset)})
+
 # ルート登録
 app.add_url_rule('/', view_func=OpeningView.as_view('opening'))
 app.add_url_rule('/start_game', view_func=StartGameView.as_view('start_game'))
 app.add_url_rule('/reset', view_func=ResetView.as_view('reset'))
 app.add_url_rule('/game', view_func=GameView.as_view('game'))
 app.add_url_rule('/game_data', view_func=GameDataView.as_view('game_data'))
+app.add_url_rule('/page_links', view_func=PageLinksView.as_view('page_links'))
+app.add_url_rule('/page_links_batch', view_func=PageLinksBatchView.as_view('page_links_batch'))
+# 静的ファイル相当のため、組み込みのstaticと同様にレート制限の対象外にする
+app.add_url_rule('/sw.js', view_func=limiter.exempt(ServiceWorkerView.as_view('service_worker')))
+app.add_url_rule('/assets/<path:filename>', view_func=limiter.exempt(AssetView.as_view('assets')))
+app.add_url_rule('/game_section', view_func=GameSectionView.as_view('game_section'))
 app.add_url_rule('/gameclear', view_func=GameClearView.as_view('game_clear'))
 app.add_url_rule('/gameover', view_func=GameOverView.as_view('game_over'))
+app.add_url_rule('/stats', view_func=StatsView.as_view('stats'))
 app.add_url_rule('/health', view_func=HealthCheckView.as_view('health'))
+app.add_url_rule('/metrics', view_func=MetricsView.as_view('metrics'))
+app.add_url_rule('/admin/memory', view_func=MemoryReportView.as_view('admin_memory'))
+# トークンで認証するAPIのためCSRFトークンは不要
+app.add_url_rule('/admin/memory/tracemalloc', view_func=csrf.exempt(TracemallocView.as_view('admin_tracemalloc')))
+
+# クリア結果の集計（ログの再生とバックグラウンドでの書き出し）
+if SCORE_DATA_DIR:
+    from score_stats import ScoreStore
+
+    score_store = ScoreStore(
+        SCORE_DATA_DIR,
+        flush_interval=app.config['SCORE_FLUSH_INTERVAL'],
+        compact_interval=app.config['SCORE_COMPACT_INTERVAL'],
+        buffer_max=app.config['SCORE_BUFFER_MAX'],
+        max_targets=app.config['SCORE_MAX_TARGETS'],
+        path_capacity=app.config['SCORE_TOP_PATHS'],
+        leaderboard_size=app.config['SCORE_LEADERBOARD_SIZE'],
+        logger=logger,
+    )
+    try:
+        replayed = score_store.start()
+        atexit.register(score_store.close)
+        # --preloadでforkしたワーカーは親のスレッド・ログを使わず、gunicornのpost_forkで自分のログを開き直す
+        os.register_at_fork(after_in_child=score_store.reset_after_fork)
+        logger.info(f"Score store loaded: {len(score_store.targets)} targets, {replayed} log entries replayed")
+    except Exception as e:
+        logger.error(f"Failed to start score store: {e}")
+        score_store = None
 
 ###########################
 # Quick tests (basic)     #
@@ -0,0 +1,169 @@
+"""
+メモリ使用量の調査用ユーティリティ
+
+キャッシュの各層について、件数・推定サイズ（参照先を含むdeep size）・大きいエントリー・経過時間の分布を集計する。
+tracemallocのスナップショットを取り、確保した場所（ファイル:行）ごとの差分を出すこともできる。
+
+サイズは sys.getsizeof の合計による推定値で、層の中で共有されているオブジェクトは最初に見つけたエントリーに計上する。
+（別の層と共有しているオブジェクト、例えばインターン済みのタイトル文字列は、それぞれの層で計上される）
+"""
+import gc
+import heapq
+import os
+import sys
+import time
+
+# 経過時間の分布の区切り（秒）
+AGE_BUCKETS = [(60, '<1m'), (300, '<5m'), (900, '<15m'), (3600, '<1h'), (21600, '<6h'), (86400, '<1d')]
+
+# サイズの計算でたどらない型（参照先を持たない、または共有されていて計上すべきでないもの）
+ATOMIC_TYPES = (str, bytes, bytearray, int, float, bool, complex, type(None), memoryview, range)
+
+
+def deep_sizeof(obj, seen):
+    """objから参照されているオブジェクトを含めた推定バイト数（seenに含まれるオブジェクトは数えない）"""
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, type):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, ATOMIC_TYPES):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            if hasattr(current, '__dict__'):
+                stack.append(current.__dict__)
+            for slot in getattr(type(current), '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return size
+
+
+def age_bucket(age):
+    """経過時間（秒）を分布の区切りの名前に変換"""
+    for limit, name in AGE_BUCKETS:
+        if age < limit:
+            return name
+    return '>=1d'
+
+
+def measure_tier(entries, largest=10, sample=None, now=None):
+    """
+    キャッシュの1層を集計する
+    - entries: (キー, 値, 保存時刻またはNone) のリスト
+    - sample: 指定すると先頭からその件数だけ測定し、合計サイズは件数比で推定する
+    """
+    now = now if now is not None else time.time()
+    seen = set()
+    measured = entries if sample is None else entries[:sample]
+    total = 0
+    top = []
+    for key, value, _ in measured:
+        size = deep_sizeof(key, seen) + deep_sizeof(value, seen)
+        total += size
+        heapq.heappush(top, (size, str(key)))
+        if len(top) > largest:
+            heapq.heappop(top)
+
+    ages = {}
+    for _, _, timestamp in entries:
+        if timestamp is not None:
+            name = age_bucket(now - timestamp)
+            ages[name] = ages.get(name, 0) + 1
+
+    estimated = total if len(measured) == len(entries) or not measured else int(total * len(entries) / len(measured))
+    return {
+        'entries': len(entries),
+        'measured_entries': len(measured),
+        'deep_bytes': estimated,
+        'largest': [{'key': key, 'bytes': size} for size, key in sorted(top, reverse=True)],
+        'ages': {name: ages[name] for _, name in AGE_BUCKETS + [(None, '>=1d')] if name in ages},
+    }
+
+
+def process_memory():
+    """プロセス全体のメモリ使用量（Linuxでは/procから、それ以外は最大RSSのみ）"""
+    result = {'gc_objects': len(gc.get_objects()), 'gc_counts': gc.get_count()}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    name, value = line.split(':', 1)
+                    result[name.lower()] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOSはバイト、Linuxはキロバイト
+        result['vmhwm'] = maxrss if sys.platform == 'darwin' else maxrss * 1024
+    result['pid'] = os.getpid()
+    return result
+
+
+class AllocationTracker:
+    """
+    tracemallocによる確保場所ごとの集計
+    - start() で追跡を開始し、基準のスナップショットを取る
+    - diff() で基準との差分を確保場所ごとに返す（reset=Trueなら現在を新しい基準にする）
+    """
+
+    def __init__(self):
+        self.baseline = None
+        self.baseline_at = None
+
+    def start(self, frames=1):
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = self.take_snapshot()
+        self.baseline_at = time.time()
+
+    def stop(self):
+        import tracemalloc
+
+        tracemalloc.stop()
+        self.baseline = None
+        self.baseline_at = None
+
+    def is_tracing(self):
+        import tracemalloc
+
+        return tracemalloc.is_tracing()
+
+    @staticmethod
+    def take_snapshot():
+        import tracemalloc
+
+        # tracemalloc自身と読み込み処理の確保は除外する
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+
+    def top(self, limit=20, group_by='lineno'):
+        """現在の確保量の多い場所"""
+        stats = self.take_snapshot().statistics(group_by)
+        return [{'site': str(stat.traceback), 'bytes': stat.size, 'count': stat.count} for stat in stats[:limit]]
+
+    def diff(self, limit=20, group_by='lineno', reset=False):
+        """基準のスナップショットとの差分（増えた順）"""
+        snapshot = self.take_snapshot()
+        stats = snapshot.compare_to(self.baseline, group_by)
+        result = {
+            'since': self.baseline_at,
+            'sites': [{'site': str(stat.traceback), 'bytes_diff': stat.size_diff, 'bytes': stat.size,
+                       'count_diff': stat.count_diff} for stat in stats[:limit]],
+        }
+        if reset:
+            self.baseline = snapshot
+            self.baseline_at = time.time()
+        return result
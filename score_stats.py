@@ -0,0 +1,526 @@
+"""
+クリア結果の集計
+
+リクエスト処理ではメモリ上のバッファに追加するだけで、ファイルへの書き込みと集計はバックグラウンドで行う。
+
+- バッファは一定間隔でまとめて追記専用のログ（ワーカーごとの scores.<PID>.<世代>.log、1行1件のJSON）に書き出し、同時に集計に反映する
+- 集計は目標ページごとに、件数・クリック数の分布・クリア時間の分位点スケッチ・よく使われた経路（Space-Saving）・上位記録を持つ
+  いずれも件数に関係なく大きさが一定なので、統計の取得は結果の件数によらず一定時間で返せる
+- 一定間隔で全ワーカーのログを集計のスナップショット（scores.snapshot.json）にまとめ、もう追記されないログを消す
+  起動時はスナップショットを読み込み、各ログのスナップショットに含まれていない部分だけを再生する
+
+複数のワーカー（同じホストのプロセス）で同じディレクトリを使える。
+- ログはワーカーごとのファイル（scores.<PID>.<世代>.log）に分け、各ワーカーは自分のログにだけ追記する
+- 他のワーカーのログの追記分は書き出しのたびに読み込み、どのワーカーの統計にも全員分の結果が入る
+- スナップショットの作成はディレクトリの排他ロック（scores.lock）を取った1プロセスだけが行う。
+  スナップショットには各ログをどこまで取り込んだか（offsets）を書き、他のワーカーはそれを見て集計を作り直す
+"""
+import bisect
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windowsではロックしない
+    fcntl = None
+
+SNAPSHOT_NAME = 'scores.snapshot.json'
+LOCK_NAME = 'scores.lock'
+LOG_PATTERN = re.compile(r'^scores\.(\d+)\.(\d+)\.log$')  # scores.<PID>.<世代>.log
+
+# 統計で返す分位点
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class QuantileSketch:
+    """
+    相対誤差つきの分位点スケッチ（対数スケールのバケットで数える）
+    値の範囲に対してバケット数は対数でしか増えないため、件数によらずほぼ一定の大きさになる
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantile(self, q):
+        """q分位点の推定値（件数が0ならNone）"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # バケットの中央（相対誤差が最小になる値）を返す
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {'relative_accuracy': self.relative_accuracy, 'zero_count': self.zero_count, 'count': self.count,
+                'buckets': {str(index): count for index, count in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.buckets = {int(index): count for index, count in data['buckets'].items()}
+        return sketch
+
+
+class SpaceSaving:
+    """
+    Space-Savingアルゴリズムによる頻出要素の上位K件（最大capacity件だけ数える）
+    数えていない要素が来たら最小の要素と入れ替え、その件数を誤差として引き継ぐ
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}  # 要素 -> [件数, 誤差]
+
+    def add(self, item):
+        counter = self.counts.get(item)
+        if counter is not None:
+            counter[0] += 1
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = [1, 0]
+            return
+        smallest = min(self.counts, key=lambda key: self.counts[key][0])
+        count = self.counts.pop(smallest)[0]
+        self.counts[item] = [count + 1, count]
+
+    def top(self, limit):
+        """件数の多い順に (要素, 件数, 誤差) を返す"""
+        items = sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [(item, counter[0], counter[1]) for item, counter in items]
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'counts': [[item, counter[0], counter[1]] for item, counter in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        top_k = cls(data['capacity'])
+        top_k.counts = {item: [count, error] for item, count, error in data['counts']}
+        return top_k
+
+
+class TargetStats:
+    """目標ページごとの集計"""
+
+    def __init__(self, path_capacity, leaderboard_size):
+        self.count = 0
+        self.clicks = {}  # クリック数 -> 件数
+        self.times = QuantileSketch()
+        self.paths = SpaceSaving(path_capacity)
+        self.leaderboard_size = leaderboard_size
+        self.leaderboard = []  # (クリック数, 時間ミリ秒, 記録時刻) の昇順（少ないクリック数・短い時間が上位）
+        self.summary = None
+
+    def add(self, result):
+        self.count += 1
+        self.clicks[result['clicks']] = self.clicks.get(result['clicks'], 0) + 1
+        self.times.add(result['time_ms'])
+        if result.get('path'):
+            self.paths.add(' → '.join(result['path']))
+        record = (result['clicks'], result['time_ms'], result['at'])
+        if len(self.leaderboard) < self.leaderboard_size or record < self.leaderboard[-1]:
+            bisect.insort(self.leaderboard, record)
+            del self.leaderboard[self.leaderboard_size:]
+        self.summary = None
+
+    def median_clicks(self):
+        rank = (self.count - 1) // 2
+        seen = 0
+        for clicks in sorted(self.clicks):
+            seen += self.clicks[clicks]
+            if seen > rank:
+                return clicks
+        return None
+
+    def build_summary(self, top_paths=5):
+        """統計をまとめる（集計の更新時にバックグラウンドで作り、取得時はそのまま返す）"""
+        return {
+            'plays': self.count,
+            'median_clicks': self.median_clicks(),
+            'clicks_histogram': {str(clicks): self.clicks[clicks] for clicks in sorted(self.clicks)},
+            'time_ms': {f'p{int(q * 100)}': round(self.times.quantile(q)) for q in QUANTILES} if self.times.count else {},
+            'top_paths': [{'path': path, 'count': count, 'error': error} for path, count, error in self.paths.top(top_paths)],
+            'leaderboard': [{'clicks': clicks, 'time_ms': time_ms, 'at': at} for clicks, time_ms, at in self.leaderboard],
+        }
+
+    def to_dict(self):
+        return {'count': self.count, 'clicks': {str(clicks): count for clicks, count in self.clicks.items()},
+                'times': self.times.to_dict(), 'paths': self.paths.to_dict(),
+                'leaderboard': [list(record) for record in self.leaderboard]}
+
+    @classmethod
+    def from_dict(cls, data, path_capacity, leaderboard_size):
+        stats = cls(path_capacity, leaderboard_size)
+        stats.count = data['count']
+        stats.clicks = {int(clicks): count for clicks, count in data['clicks'].items()}
+        stats.times = QuantileSketch.from_dict(data['times'])
+        stats.paths = SpaceSaving.from_dict(data['paths'])
+        stats.paths.capacity = path_capacity
+        stats.leaderboard = sorted(tuple(record) for record in data['leaderboard'])[:leaderboard_size]
+        return stats
+
+
+
+
+def process_alive(pid):
+    """同じホストでプロセスが動いているか（確かめられない場合は動いているとみなす）"""
+    if pid == os.getpid() or os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class ScoreStore:
+    """
+    クリア結果のバッファ・追記ログ・集計
+    - record(): リクエスト処理から呼ぶ。バッファに追加するだけ（一杯なら捨てて数える）
+    - summary(): 目標ページの統計。バックグラウンドで作っておいたものを返す
+    - start(): 書き出し・スナップショット用のバックグラウンドスレッドを起動する
+    """
+
+    def __init__(self, directory, flush_interval=2.0, compact_interval=600, buffer_max=10000,
+                 max_targets=5000, path_capacity=50, leaderboard_size=10, logger=None):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.path_capacity = path_capacity
+        self.leaderboard_size = leaderboard_size
+        self.max_targets = max_targets
+        self.logger = logger
+        self.buffer = deque()
+        self.buffer_max = buffer_max
+        self.targets = OrderedDict()  # 目標ページ -> TargetStats（最近記録のあった順）
+        self.summaries = {}  # 目標ページ -> 統計（取得時はここを読むだけ）
+        self.changed = set()  # 統計を作り直す必要のある目標ページ
+        self.flush_lock = threading.Lock()
+        self.generation = 0
+        self.log_name = None  # 自分のログのファイル名
+        self.log_file = None
+        self.lock_file = None
+        self.offsets = {}  # ログのファイル名 -> 集計に取り込んだバイト数
+        self.snapshot_id = None  # 集計の元にしたスナップショット（作り直されたかの判定用）
+        self.last_compacted = time.monotonic()
+        self.thread = None
+        self.counts = {'recorded': 0, 'dropped': 0, 'flushed': 0, 'flushes': 0, 'merged': 0, 'reloads': 0,
+                       'compactions': 0, 'write_errors': 0}
+
+    # リクエスト処理から呼ぶ部分
+
+    def record(self, result):
+        """クリア結果をバッファに追加する（ファイルへの書き込みはしない）"""
+        if len(self.buffer) >= self.buffer_max:
+            self.counts['dropped'] += 1
+            return False
+        self.buffer.append(result)
+        self.counts['recorded'] += 1
+        return True
+
+    def summary(self, target):
+        """目標ページの統計（記録がなければNone）"""
+        return self.summaries.get(target)
+
+    def stats(self):
+        return {'buffered': len(self.buffer), 'targets': len(self.targets), 'generation': self.generation,
+                'logs': len(self.offsets), **self.counts}
+
+    # バックグラウンドで行う部分
+
+    def apply(self, result):
+        """1件を集計に反映する"""
+        target = result['target']
+        stats = self.targets.get(target)
+        if stats is None:
+            stats = self.targets[target] = TargetStats(self.path_capacity, self.leaderboard_size)
+            while len(self.targets) > self.max_targets:
+                evicted, _ = self.targets.popitem(last=False)
+                self.summaries.pop(evicted, None)
+        else:
+            self.targets.move_to_end(target)
+        stats.add(result)
+        self.changed.add(target)
+
+    def refresh_summaries(self):
+        """更新のあった目標ページの統計を作り直す"""
+        for target in self.changed:
+            stats = self.targets.get(target)
+            if stats is not None:
+                stats.summary = stats.build_summary()
+                self.summaries[target] = stats.summary
+        self.changed.clear()
+
+    def log_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def list_logs(self):
+        """全ワーカーのログを (ファイル名, PID, 世代) の世代順で返す"""
+        logs = []
+        for name in os.listdir(self.directory):
+            match = LOG_PATTERN.match(name)
+            if match:
+                logs.append((name, int(match.group(1)), int(match.group(2))))
+        return sorted(logs, key=lambda log: log[2])
+
+    def open_log(self, generation):
+        """自分のログを新しい世代に切り替える（ディレクトリの排他ロック中に呼ぶ）"""
+        if self.log_file is not None:
+            self.log_file.close()
+        self.generation = generation
+        self.log_name = f'scores.{os.getpid()}.{generation}.log'
+        self.log_file = open(self.log_path(self.log_name), 'a', encoding='utf-8')
+
+    def next_generation(self, snapshot):
+        """まだどのログにも使われていない世代（消したログの世代はスナップショットに残っている）"""
+        generations = [generation for _, _, generation in self.list_logs()]
+        if snapshot is not None:
+            generations.append(snapshot['generation'])
+        return max(generations, default=0) + 1
+
+    @contextmanager
+    def directory_lock(self, exclusive=True):
+        """ディレクトリのロック（スナップショットの作成は排他、読み込みは共有）"""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+
+    def snapshot_identity(self):
+        try:
+            stat = os.stat(os.path.join(self.directory, SNAPSHOT_NAME))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def read_snapshot(self):
+        """スナップショットを読む（なければNone）"""
+        try:
+            with open(os.path.join(self.directory, SNAPSHOT_NAME), encoding='utf-8') as f:
+                stat = os.fstat(f.fileno())
+                return json.load(f), (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None, None
+
+    def replay(self, name, offset):
+        """ログのoffsetバイト目以降の行を集計に反映し、(読み終えた位置, 件数) を返す"""
+        try:
+            with open(self.log_path(name), 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return offset, 0
+        # 書き込み途中の最後の行は、改行まで書かれてから読む
+        end = data.rfind(b'\n') + 1
+        replayed = 0
+        for line in data[:end].splitlines():
+            try:
+                self.apply(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                # 書き込み途中で止まった行などは読み飛ばす
+                continue
+            replayed += 1
+        return offset + end, replayed
+
+    def rebuild(self, snapshot, snapshot_id):
+        """スナップショットと、それに含まれていない全ワーカーのログから集計を作り直す"""
+        self.targets.clear()
+        self.changed.clear()
+        merged = {}
+        if snapshot is not None:
+            for target, data in snapshot['targets'].items():
+                self.targets[target] = TargetStats.from_dict(data, self.path_capacity, self.leaderboard_size)
+                self.changed.add(target)
+            merged = snapshot.get('offsets', {})
+        self.offsets = {}
+        replayed = 0
+        for name, _, _ in self.list_logs():
+            self.offsets[name], count = self.replay(name, merged.get(name, 0))
+            replayed += count
+        for target in list(self.summaries):
+            if target not in self.targets:
+                self.summaries.pop(target, None)
+        self.refresh_summaries()
+        self.snapshot_id = snapshot_id
+        return replayed
+
+    def flush(self):
+        """バッファの内容を自分のログに追記し、集計に反映する"""
+        with self.flush_lock:
+            results = []
+            while self.buffer:
+                results.append(self.buffer.popleft())
+            if not results:
+                return 0
+            try:
+                self.log_file.write(''.join(json.dumps(result, ensure_ascii=False, separators=(',', ':')) + '\n'
+                                            for result in results))
+                self.log_file.flush()
+            except OSError as e:
+                # 書き込めなくてもこのワーカーの集計には反映する（他のワーカーや再起動後の集計には入らない）
+                self.counts['write_errors'] += 1
+                if self.logger:
+                    self.logger.error(f"Failed to append score log: {e}")
+            for result in results:
+                self.apply(result)
+            self.refresh_summaries()
+            self.counts['flushed'] += len(results)
+            self.counts['flushes'] += 1
+            return len(results)
+
+    def sync(self):
+        """
+        他のワーカーのログの追記分を集計に取り込む
+        他のワーカーがスナップショットを作り直していたら、スナップショットから集計を作り直す
+        """
+        with self.flush_lock, self.directory_lock(exclusive=False):
+            if self.snapshot_identity() != self.snapshot_id:
+                replayed = self.rebuild(*self.read_snapshot())
+                self.counts['reloads'] += 1
+                return replayed
+            replayed = 0
+            for name, _, _ in self.list_logs():
+                if name != self.log_name:
+                    self.offsets[name], count = self.replay(name, self.offsets.get(name, 0))
+                    replayed += count
+            self.refresh_summaries()
+            self.counts['merged'] += replayed
+            return replayed
+
+    def closed_logs(self):
+        """もう追記されないログ（同じPIDに新しい世代がある、または書いていたプロセスが終了した）"""
+        logs = self.list_logs()
+        newest = {}
+        for _, pid, generation in logs:
+            newest[pid] = max(generation, newest.get(pid, generation))
+        return [name for name, pid, generation in logs if generation < newest[pid] or not process_alive(pid)]
+
+    def compact(self):
+        """
+        全ワーカーのログをスナップショットにまとめ、もう追記されないログを消す（排他ロック中に1プロセスだけが行う）
+        1. 自分のログを次の世代に切り替える（以降の追記はそちらへ）
+        2. スナップショットと全ワーカーのログから集計を作り直す
+        3. 各ログをどこまで取り込んだか（offsets）と合わせてスナップショットを書く
+        4. もう追記されないログを消す
+        どこで止まっても、起動時に「スナップショットのoffsets以降」を再生すれば二重に数えない
+        他のワーカーがcompact_interval以内にスナップショットを作っていれば、1.だけ行う
+        """
+        self.flush()
+        with self.flush_lock, self.directory_lock():
+            self.last_compacted = time.monotonic()
+            snapshot, snapshot_id = self.read_snapshot()
+            if self.log_file.tell() > 0:
+                self.open_log(self.next_generation(snapshot))
+            if snapshot is not None and time.time() - snapshot['created'] < self.compact_interval:
+                return False
+            replayed = self.rebuild(snapshot, snapshot_id)
+            closed = self.closed_logs()
+            if replayed:
+                snapshot = {
+                    'generation': self.next_generation(snapshot) - 1,
+                    'created': time.time(),
+                    'targets': {target: stats.to_dict() for target, stats in self.targets.items()},
+                    'offsets': self.offsets,
+                }
+                path = os.path.join(self.directory, SNAPSHOT_NAME)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+                self.snapshot_id = self.snapshot_identity()
+                self.counts['compactions'] += 1
+            for name in closed:
+                try:
+                    os.remove(self.log_path(name))
+                except FileNotFoundError:
+                    pass
+                self.offsets.pop(name, None)
+            return bool(replayed)
+
+    def load(self):
+        """スナップショットと全ワーカーのログから集計を作り、自分のログを開く"""
+        os.makedirs(self.directory, exist_ok=True)
+        if self.lock_file is None:
+            self.lock_file = open(os.path.join(self.directory, LOCK_NAME), 'a')
+        with self.flush_lock, self.directory_lock():
+            snapshot, snapshot_id = self.read_snapshot()
+            replayed = self.rebuild(snapshot, snapshot_id)
+            self.open_log(self.next_generation(snapshot))
+            self.offsets[self.log_name] = 0
+        return replayed
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                self.sync()
+                if time.monotonic() - self.last_compacted >= self.compact_interval:
+                    self.compact()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Score store background task failed: {e}")
+
+    def start(self):
+        """ログを読み込み、バックグラウンドスレッドを起動する"""
+        replayed = self.load()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return replayed
+
+    def reset_after_fork(self):
+        """fork後の子プロセスでは親のスレッド・ロック・ログを使わない（start()で自分のログを開き直す）"""
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.buffer.clear()
+        for f in (self.log_file, self.lock_file):
+            if f is not None:
+                f.close()
+        self.log_file = None
+        self.lock_file = None
+
+    def close(self):
+        """終了時にバッファを自分のログに書き出す（スナップショットには次に作るときにまとめる）"""
+        try:
+            self.flush()
+        finally:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
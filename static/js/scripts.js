@@ -87,11 +87,79 @@ function preloadVisibleLinks() {
         return rect.top < window.innerHeight && rect.bottom > 0;
     });
     
-    // 見えているリンクを優先的にプリロード
-    visibleLinks.slice(0, 5).forEach(link => {
-        if (!preloadCache.has(link.href)) {
-            preloadPage(link.href);
+    // 見えているリンクを1回の一括リクエストでプリロード
+    preloadBatch(visibleLinks.map(link => link.href).filter(href => !preloadCache.has(href)).slice(0, 20));
+}
+
+// 複数ページのリンク一覧を一括取得（NDJSONを1行ずつ処理し、届いたものから使う）
+function preloadBatch(urls) {
+    if (urls.length === 0) return;
+    
+    // ページタイトルごとに対象のリンクをまとめる
+    const urlsByPage = new Map();
+    urls.forEach(url => {
+        const page = new URL(url).searchParams.get('page');
+        if (!urlsByPage.has(page)) {
+            urlsByPage.set(page, []);
+        }
+        urlsByPage.get(page).push(url);
+        preloadCache.set(url, 'loading');
+    });
+    
+    const params = new URLSearchParams();
+    urlsByPage.forEach((_, page) => params.append('page', page));
+    
+    const handleLine = (text) => {
+        if (!text.trim()) return;
+        const data = JSON.parse(text);
+        (urlsByPage.get(data.requested) || []).forEach(url => {
+            if (data.status === 'success') {
+                // 残りクリック数はクライアント側で計算する
+                const clicks = parseInt(new URL(url).searchParams.get('clicks'), 10);
+                preloadCache.set(url, {
+                    status: 'loaded',
+                    data: data,
+                    clicksRemaining: clicks,
+                    nextClicks: clicks - 1,
+                    timestamp: Date.now()
+                });
+            } else {
+                preloadCache.delete(url);
+            }
+        });
+        urlsByPage.delete(data.requested);
+    };
+    
+    fetch(`/page_links_batch?${params.toString()}`, {
+        method: 'GET',
+        headers: {
+            'X-Requested-With': 'XMLHttpRequest',
+            'Accept': 'application/x-ndjson'
+        }
+    })
+    .then(async response => {
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(handleLine);
         }
+        handleLine(buffer);
+    })
+    .catch(error => {
+        console.warn('Batch preload failed:', error);
+    })
+    .finally(() => {
+        // 結果が届かなかったリンクは、後で個別にプリロードできるように戻す
+        urlsByPage.forEach(pageUrls => pageUrls.forEach(url => preloadCache.delete(url)));
     });
 }
 
@@ -116,13 +184,11 @@ function preloadPage(url) {
     // URLからパラメータを抽出
     const urlObj = new URL(url);
     const page = urlObj.searchParams.get('page');
-    const clicks = urlObj.searchParams.get('clicks');
-    const mytarget = urlObj.searchParams.get('mytarget');
-    const difficulty = urlObj.searchParams.get('difficulty');
-    const start_time = urlObj.searchParams.get('start_time');
+    const clicks = parseInt(urlObj.searchParams.get('clicks'), 10);
     
-    // 軽量なAPIエンドポイントを使用
-    const apiUrl = `/game_data?page=${encodeURIComponent(page)}&clicks=${clicks}&mytarget=${encodeURIComponent(mytarget)}&difficulty=${difficulty}&start_time=${start_time}`;
+    // プレイヤーに依存しないページ単位のリンク一覧を使用（Service Worker・プロキシで共有キャッシュされる）
+    // 残りクリック数はクライアント側で計算する
+    const apiUrl = `/page_links?page=${encodeURIComponent(page)}`;
     
     // fetchでページデータをプリロード（タイムアウト短縮）
     const controller = new AbortController();
@@ -149,6 +215,8 @@ function preloadPage(url) {
             preloadCache.set(url, {
                 status: 'loaded',
                 data: data,
+                clicksRemaining: clicks,
+                nextClicks: clicks - 1,
                 timestamp: Date.now()
             });
             console.log('Page preloaded:', url);
@@ -173,6 +241,39 @@ function preloadPage(url) {
     });
 }
 
+// 経路の記録（クリア時の統計用。ゲームごとにstart_timeで区別する）
+function getVisitedPages() {
+    try {
+        return JSON.parse(sessionStorage.getItem('sixhop_path')) || null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function recordVisitedPage() {
+    if (window.location.pathname !== '/game') return;
+    const params = new URLSearchParams(window.location.search);
+    const page = params.get('page');
+    if (!page) return;
+    
+    const start = params.get('start_time') || '';
+    let state = getVisitedPages();
+    if (!state || state.start !== start) {
+        state = { start: start, pages: [] };
+    }
+    // 再読み込みでは追加しない
+    if (state.pages[state.pages.length - 1] !== page) {
+        state.pages.push(page);
+    }
+    try {
+        sessionStorage.setItem('sixhop_path', JSON.stringify(state));
+    } catch (error) {
+        // 保存できなくてもゲームは続けられる
+    }
+}
+
+document.addEventListener('DOMContentLoaded', recordVisitedPage);
+
 // リンククリック時の処理（最適化版）
 document.addEventListener('click', function(e) {
     const link = e.target.closest('a[href]');
@@ -181,6 +282,14 @@ document.addEventListener('click', function(e) {
     // Wikipedia内のリンクのみ対象
     if (!link.href.includes('/game?page=')) return;
     
+    // 目標ページへのリンクには、ここまでの経路を付ける（サーバーがクリック数と照合して統計に使う）
+    const linkUrl = new URL(link.href);
+    const state = getVisitedPages();
+    if (state && linkUrl.searchParams.get('page') === linkUrl.searchParams.get('mytarget')) {
+        linkUrl.searchParams.set('path', state.pages.join('|'));
+        link.href = linkUrl.toString();
+    }
+    
     // プリロード済みの場合は即座に遷移
     const cached = preloadCache.get(link.href);
     if (cached && cached.status === 'loaded') {
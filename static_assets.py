@@ -0,0 +1,105 @@
+"""
+静的ファイルのフィンガープリントと事前圧縮
+
+static/ 以下のファイルを内容のハッシュ付きの名前（例: css/styles.3f2a9c1d0b7e.css）でビルドディレクトリに書き出し、
+テキスト系のファイルには .gz（とbrotliがインストールされていれば .br）の圧縮版も作る。
+ファイル名に内容のハッシュが入るため、ブラウザには1年間・immutableでキャッシュさせてよい。
+
+書き出すファイルは内容で名前が決まるため、既にあれば書き直さない（複数ワーカーが同時に作っても安全）。
+
+デプロイ時のビルドステップとして実行することもできる:
+    python static_assets.py [--static static] [--build static_build]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # brotliは任意（なければ .gz だけ作る）
+    brotli = None
+
+# 圧縮版を作る拡張子（画像などは既に圧縮済みなので対象外）
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+
+# 圧縮しても小さくならないファイルは圧縮版を作らない
+MIN_COMPRESS_BYTES = 512
+
+# ハッシュの長さ（16進数の文字数）
+DIGEST_LENGTH = 12
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def fingerprint_name(filename, digest):
+    """ファイル名に内容のハッシュを入れる（css/styles.css -> css/styles.<digest>.css）"""
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{digest}{ext}'
+
+
+def write_if_missing(path, data):
+    """ファイルがなければ一時ファイル経由で書き出す"""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_assets(static_dir, build_dir):
+    """
+    static_dir以下の全ファイルをフィンガープリント付きでbuild_dirに書き出す
+    戻り値は {元のファイル名: {'path': フィンガープリント付きのファイル名, 'encodings': [作った圧縮形式]}}
+    """
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in sorted(filenames):
+            if name.startswith('.'):
+                continue
+            source = os.path.join(dirpath, name)
+            filename = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            hashed = fingerprint_name(filename, hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH])
+            target = os.path.join(build_dir, hashed)
+            write_if_missing(target, data)
+
+            encodings = []
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_BYTES:
+                # mtime=0で毎回同じバイト列にする
+                write_if_missing(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                encodings.append('gzip')
+                if brotli is not None:
+                    write_if_missing(target + '.br', brotli.compress(data, quality=11))
+                    encodings.append('br')
+
+            manifest[filename] = {'path': hashed, 'encodings': encodings}
+
+    os.makedirs(build_dir, exist_ok=True)
+    tmp_path = os.path.join(build_dir, f'{MANIFEST_NAME}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(build_dir, MANIFEST_NAME))
+    return manifest
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Fingerprint and pre-compress static assets')
+    parser.add_argument('--static', default=os.path.join(base_dir, 'static'))
+    parser.add_argument('--build', default=os.environ.get('STATIC_BUILD_DIR', os.path.join(base_dir, 'static_build')))
+    args = parser.parse_args()
+
+    manifest = build_assets(args.static, args.build)
+    compressed = sum(1 for entry in manifest.values() if entry['encodings'])
+    print(f"Built {len(manifest)} assets ({compressed} pre-compressed, brotli={'yes' if brotli else 'no'}) into {args.build}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,16 @@
 // Service Worker for Wiki SixHop
 const CACHE_NAME = 'wiki-sixhop-v1';
 const STATIC_CACHE = 'static-v1';
-const API_CACHE = 'api-v1';
+const API_CACHE = 'api-v2';
 
 // キャッシュするリソース
+// /static/ のURLは配信時にフィンガープリント付きのURL（/assets/...）に置き換えられる
+// 同一オリジンのものだけにする（CSPのconnect-srcで他オリジンへのfetchは拒否され、addAllごと失敗するため）
 const STATIC_ASSETS = [
     '/',
     '/static/css/styles.css',
     '/static/js/scripts.js',
-    'https://cdn.jsdelivr.net/npm/canvas-confetti@1.9.2/dist/confetti.browser.min.js',
-    'https://fonts.googleapis.com/css2?family=Noto+Sans:wght@300;400;500;600;700&display=swap'
+    '/static/js/confetti.browser.min.js'
 ];
 
 // インストール時の処理
@@ -41,6 +42,18 @@ self.addEventListener('activate', function(event) {
                     }
                 })
             );
+        }).then(function() {
+            // 古いフィンガープリントのファイルを削除（使われているものは次のアクセスで再びキャッシュされる）
+            return caches.open(STATIC_CACHE).then(function(cache) {
+                return cache.keys().then(function(requests) {
+                    return Promise.all(requests.map(function(request) {
+                        const url = new URL(request.url);
+                        if (url.pathname.startsWith('/assets/') && !STATIC_ASSETS.includes(url.pathname)) {
+                            return cache.delete(request);
+                        }
+                    }));
+                });
+            });
         }).then(function() {
             console.log('Service Worker activated');
             return self.clients.claim();
@@ -53,11 +66,18 @@ self.addEventListener('fetch', function(event) {
     const request = event.request;
     const url = new URL(request.url);
 
+    // 他オリジン（Google Fontsなど）はService Workerを通さずブラウザに任せる
+    // （Service Worker内のfetchはCSPのconnect-srcの対象になり、拒否されるため）
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
     // 静的ファイルのキャッシュ戦略
     if (request.destination === 'style' || 
         request.destination === 'script' || 
         request.destination === 'image' ||
-        url.pathname.startsWith('/static/')) {
+        url.pathname.startsWith('/static/') ||
+        url.pathname.startsWith('/assets/')) {
         
         event.respondWith(
             caches.match(request)
@@ -79,28 +99,23 @@ self.addEventListener('fetch', function(event) {
         return;
     }
 
-    // APIエンドポイントのキャッシュ戦略
-    if (url.pathname === '/game_data') {
+    // ページ単位のリンク一覧のキャッシュ戦略（プレイヤーに依存しないので全プレイヤー・全手番で共有できる）
+    // キャッシュから返しつつバックグラウンドで再検証する。再検証はETag（If-None-Match）で304になることが多い
+    if (url.pathname === '/page_links') {
         event.respondWith(
             caches.open(API_CACHE).then(function(cache) {
                 return cache.match(request).then(function(response) {
-                    if (response) {
-                        // キャッシュから返すが、バックグラウンドで更新
-                        fetch(request).then(function(fetchResponse) {
-                            if (fetchResponse.status === 200) {
-                                cache.put(request, fetchResponse.clone());
-                            }
-                        });
-                        return response;
-                    }
-                    
-                    // キャッシュにない場合はネットワークから取得
-                    return fetch(request).then(function(fetchResponse) {
+                    const network = fetch(request).then(function(fetchResponse) {
                         if (fetchResponse.status === 200) {
                             cache.put(request, fetchResponse.clone());
                         }
                         return fetchResponse;
                     });
+                    if (response) {
+                        network.catch(function() {});
+                        return response;
+                    }
+                    return network;
                 });
             })
         );